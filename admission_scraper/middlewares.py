@@ -4,10 +4,17 @@
 # https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
 from scrapy import signals
+from scrapy.exceptions import IgnoreRequest, NotConfigured
+from scrapy.http import Headers
+from scrapy.responsetypes import responsetypes
 
 # useful for handling different item types with a single interface
 from itemadapter import is_item, ItemAdapter
 
+from admission_scraper.utils.response_store import ResponseStore
+from admission_scraper.utils.revalidation import ValidatorStore, hash_body
+from admission_scraper.utils.url import url_key
+
 
 class AdmissionScraperSpiderMiddleware:
     # Not all methods need to be defined. If a method is not defined,
@@ -101,3 +108,317 @@ class AdmissionScraperDownloaderMiddleware:
 
     def spider_opened(self, spider):
         spider.logger.info("Spider opened: %s" % spider.name)
+
+
+class ConditionalRevalidationMiddleware:
+    """
+    Send If-None-Match / If-Modified-Since using validators stored from the
+    previous run and drop responses that did not change. New validators are
+    staged and committed by main.py once the pages were stored.
+
+    A 304, or a 200 whose body hash matches the stored one, raises
+    IgnoreRequest so the spider never parses the page (or follows its PDFs).
+    """
+
+    def __init__(self, store, spiders, stats):
+        self.store = store
+        self.spiders = set(spiders)
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool("REVALIDATION_ENABLED"):
+            raise NotConfigured
+        store = ValidatorStore(
+            settings.get("REVALIDATION_STORE", "revalidation.sqlite"),
+            settings.getint("REVALIDATION_FLUSH_EVERY", 200),
+        )
+        s = cls(store, settings.getlist("REVALIDATION_SPIDERS"), crawler.stats)
+        crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        return s
+
+    def enabled_for(self, spider):
+        return spider.name in self.spiders
+
+    def process_request(self, request, spider):
+        if not self.enabled_for(spider) or request.meta.get("discovery"):
+            return None
+
+        validators = self.store.get(request.url)
+        if not validators:
+            return None
+        if validators["etag"]:
+            request.headers.setdefault("If-None-Match", validators["etag"])
+        if validators["last_modified"]:
+            request.headers.setdefault("If-Modified-Since", validators["last_modified"])
+        return None
+
+    def process_response(self, request, response, spider):
+        if not self.enabled_for(spider) or request.meta.get("discovery"):
+            return response
+
+        if response.status == 304:
+            self.stats.inc_value("revalidation/not_modified", spider=spider)
+            raise IgnoreRequest(f"Not modified: {request.url}")
+
+        if response.status != 200:
+            return response
+
+        previous = self.store.get(request.url)
+        body_hash = hash_body(response.body)
+        self.store.set(
+            request.url,
+            response.headers.get("ETag", b"").decode("latin-1") or None,
+            response.headers.get("Last-Modified", b"").decode("latin-1") or None,
+            body_hash,
+        )
+
+        if previous and previous["body_hash"] == body_hash:
+            self.stats.inc_value("revalidation/unchanged_body", spider=spider)
+            raise IgnoreRequest(f"Unchanged body: {request.url}")
+
+        self.stats.inc_value("revalidation/changed", spider=spider)
+        return response
+
+    def spider_opened(self, spider):
+        if self.enabled_for(spider):
+            self.store.open(clear_staged=True)
+
+    def spider_closed(self, spider):
+        if self.enabled_for(spider):
+            self.store.close()
+
+
+class AdaptiveThrottleMiddleware:
+    """
+    Tune each host's download slot concurrency and delay from its observed
+    latency and error rate.
+
+    Healthy hosts (EWMA latency under the target, few errors) whose slot has
+    queued requests get one more concurrent request, up to the per-host
+    maximum. Slow hosts lose one, and errors (timeouts, connection failures,
+    429/5xx) halve the concurrency and double the delay. The global in-flight
+    budget is CONCURRENT_REQUESTS, which the downloader enforces across slots.
+    """
+
+    ERROR_STATUSES = {429, 500, 502, 503, 504}
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.min_concurrency = settings.getint("ADAPTIVE_THROTTLE_MIN_CONCURRENCY", 1)
+        self.max_concurrency = settings.getint("ADAPTIVE_THROTTLE_MAX_CONCURRENCY", 8)
+        self.target_latency = settings.getfloat("ADAPTIVE_THROTTLE_TARGET_LATENCY", 2.0)
+        self.max_error_rate = settings.getfloat("ADAPTIVE_THROTTLE_MAX_ERROR_RATE", 0.1)
+        self.max_delay = settings.getfloat("ADAPTIVE_THROTTLE_MAX_DELAY", 10.0)
+        self.alpha = settings.getfloat("ADAPTIVE_THROTTLE_SMOOTHING", 0.3)
+        self.hosts = {}
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool("ADAPTIVE_THROTTLE_ENABLED"):
+            raise NotConfigured
+        if crawler.settings.getbool("AUTOTHROTTLE_ENABLED"):
+            raise NotConfigured("AdaptiveThrottle and AutoThrottle are exclusive")
+        return cls(crawler)
+
+    def get_slot(self, request):
+        downloader = self.crawler.engine.downloader
+        key = request.meta.get("download_slot") or downloader.get_slot_key(request)
+        return key, downloader.slots.get(key)
+
+    def record(self, request, error):
+        key, slot = self.get_slot(request)
+        if slot is None:
+            return
+
+        host = self.hosts.setdefault(key, {"latency": None, "error_rate": 0.0})
+        latency = request.meta.get("download_latency")
+        if latency is not None:
+            host["latency"] = (
+                latency
+                if host["latency"] is None
+                else self.alpha * latency + (1 - self.alpha) * host["latency"]
+            )
+        host["error_rate"] = self.alpha * float(error) + (1 - self.alpha) * host[
+            "error_rate"
+        ]
+
+        if error:
+            self.adjust(slot, max(self.min_concurrency, slot.concurrency // 2), "backoff")
+            slot.delay = min(self.max_delay, max(slot.delay * 2, 0.5))
+            return
+
+        if host["latency"] is not None and host["latency"] > 2 * self.target_latency:
+            self.adjust(slot, max(self.min_concurrency, slot.concurrency - 1), "decrease")
+        elif (
+            host["latency"] is not None
+            and host["latency"] < self.target_latency
+            and host["error_rate"] < self.max_error_rate
+            and slot.queue
+        ):
+            self.adjust(slot, min(self.max_concurrency, slot.concurrency + 1), "increase")
+
+        # Recover the delay gradually once the host answers again
+        slot.delay = slot.delay * 0.5 if slot.delay > 0.05 else 0.0
+
+    def adjust(self, slot, concurrency, decision):
+        if concurrency == slot.concurrency:
+            return
+        slot.concurrency = concurrency
+        self.stats.inc_value(f"adaptive_throttle/{decision}")
+        self.stats.max_value("adaptive_throttle/max_host_concurrency", concurrency)
+
+    def process_response(self, request, response, spider):
+        self.record(request, response.status in self.ERROR_STATUSES)
+        return response
+
+    def process_exception(self, request, exception, spider):
+        if not isinstance(exception, IgnoreRequest):
+            self.record(request, True)
+        return None
+
+
+def serialize_headers(headers):
+    # Bodies are archived decompressed, so drop headers describing the wire format
+    return {
+        key.decode("latin-1"): [value.decode("latin-1") for value in values]
+        for key, values in headers.items()
+        if key.lower() not in (b"content-encoding", b"content-length")
+    }
+
+
+class ResponseArchiveMiddleware:
+    """
+    Write every successful page and PDF response to the content-addressed
+    ResponseStore so extraction can later be replayed without the network.
+    """
+
+    def __init__(self, store, spiders):
+        self.store = store
+        self.spiders = set(spiders)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool("RESPONSE_ARCHIVE_ENABLED"):
+            raise NotConfigured
+        s = cls(
+            ResponseStore(settings.get("RESPONSE_ARCHIVE_DIR", "response_archive")),
+            settings.getlist("RESPONSE_ARCHIVE_SPIDERS"),
+        )
+        crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        return s
+
+    def process_response(self, request, response, spider):
+        if (
+            spider.name not in self.spiders
+            or request.meta.get("discovery")
+            or response.status != 200
+        ):
+            return response
+
+        original_url = request.meta.get("original_url")
+        meta = {
+            "original_url": original_url,
+            "is_pdf": bool(request.meta.get("is_pdf")),
+            # link_sites is keyed by url_key(), like PagesSpider.get_sites_for_link
+            "sites": getattr(spider, "link_sites", {}).get(url_key(original_url))
+            if original_url
+            else None,
+        }
+        headers = serialize_headers(response.headers)
+        # Also index the URLs that redirected here so replayed requests find them
+        for url in [*request.meta.get("redirect_urls", []), request.url]:
+            self.store.put(url, response.url, response.status, headers, response.body, meta)
+        return response
+
+    def spider_opened(self, spider):
+        if spider.name in self.spiders:
+            self.store.open()
+
+    def spider_closed(self, spider):
+        if spider.name in self.spiders:
+            self.store.close()
+
+
+class ResponseReplayMiddleware:
+    """
+    Serve every request from the ResponseStore instead of the network.
+    Requests for URLs that were never archived are ignored.
+    """
+
+    def __init__(self, store, stats):
+        self.store = store
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool("RESPONSE_REPLAY_ENABLED"):
+            raise NotConfigured
+        s = cls(
+            ResponseStore(settings.get("RESPONSE_ARCHIVE_DIR", "response_archive")),
+            crawler.stats,
+        )
+        crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        return s
+
+    def process_request(self, request, spider):
+        entry = self.store.latest(request.url)
+        if entry is None:
+            self.stats.inc_value("replay/missing", spider=spider)
+            raise IgnoreRequest(f"Not archived: {request.url}")
+
+        body = self.store.read_body(entry["body_hash"])
+        headers = Headers(entry["headers"])
+        respcls = responsetypes.from_args(
+            headers=headers, url=entry["response_url"], body=body
+        )
+        self.stats.inc_value("replay/served", spider=spider)
+        return respcls(
+            url=entry["response_url"],
+            status=entry["status"],
+            headers=headers,
+            body=body,
+            request=request,
+        )
+
+    def spider_opened(self, spider):
+        self.store.open()
+
+    def spider_closed(self, spider):
+        self.store.close()
+
+
+class FrontierMiddleware:
+    """
+    Record fetch outcomes of frontier-tracked requests (meta["frontier"] is
+    "site" or "page") in the spider's CrawlFrontier, so the next run only
+    starts from URLs that are due. The fetches are staged and committed by
+    main.py once the pages were stored.
+    """
+
+    def process_response(self, request, response, spider):
+        frontier = getattr(spider, "frontier", None)
+        kind = request.meta.get("frontier")
+        if frontier is None or not kind:
+            return response
+
+        if response.status == 304:
+            body_hash = None
+        elif response.status == 200:
+            body_hash = hash_body(response.body)
+        else:
+            return response
+
+        url = request.meta.get("original_url") or request.url
+        frontier.record(
+            url, kind, request.meta.get("frontier_site"), body_hash, page_url=request.url
+        )
+        return response
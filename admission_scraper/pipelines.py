@@ -5,6 +5,14 @@
 
 import json
 import os
+from itemadapter import ItemAdapter
+from admission_scraper.utils.records import (
+    PAGE_DICTIONARY_COLUMNS,
+    open_record_writer,
+    page_schema,
+    record_path,
+)
+from admission_scraper.utils.sharding import shard_path
 
 
 class SpiderSpecificOutputPipeline:
@@ -41,3 +49,64 @@ class SpiderSpecificOutputPipeline:
             line = json.dumps(dict(item), ensure_ascii=False) + "\n"
             self.file.write(line)
         return item
+
+
+class PageOutputPipeline:
+    """
+    Writes the items of page spiders to one record file per crawl (or
+    shard), buffering PAGE_OUTPUT_BATCH_SIZE items per write: gzip JSON
+    lines by default, or Parquet with dictionary-encoded url/site/source_type
+    columns. Read it back with admission_scraper.utils.records.iter_record_batches.
+    """
+
+    def __init__(self, path, batch_size=500, spiders=None):
+        self.path = path
+        self.batch_size = batch_size
+        self.spiders = spiders or []
+        self.writer = None
+        self.buffer = []
+        self.count = 0
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        path = shard_path(
+            record_path("pages", settings.get("PAGE_OUTPUT_FORMAT", "jsonl.gz")),
+            settings.getint("SHARD_INDEX", 0),
+            settings.getint("SHARD_COUNT", 1),
+        )
+        return cls(
+            path,
+            settings.getint("PAGE_OUTPUT_BATCH_SIZE", 500),
+            settings.getlist("PAGE_OUTPUT_SPIDERS"),
+        )
+
+    def open_spider(self, spider):
+        if spider.name not in self.spiders:
+            return
+        self.writer = open_record_writer(
+            self.path,
+            schema=page_schema() if self.path.endswith(".parquet") else None,
+            dictionary_columns=PAGE_DICTIONARY_COLUMNS,
+        )
+
+    def close_spider(self, spider):
+        if self.writer is None:
+            return
+        self.flush()
+        self.writer.close()
+        self.writer = None
+        print(f"Wrote {self.count} items to {self.path}")
+
+    def process_item(self, item, spider):
+        if self.writer is not None:
+            self.buffer.append(ItemAdapter(item).asdict())
+            if len(self.buffer) >= self.batch_size:
+                self.flush()
+        return item
+
+    def flush(self):
+        if self.buffer:
+            self.writer.write(self.buffer)
+            self.count += len(self.buffer)
+            self.buffer = []
@@ -20,7 +20,8 @@ USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTM
 ROBOTSTXT_OBEY = False
 
 # Configure maximum concurrent requests performed by Scrapy (default: 16)
-# CONCURRENT_REQUESTS = 32
+# This is the global in-flight budget shared by all hosts
+CONCURRENT_REQUESTS = 64
 
 # Configure a delay for requests for the same website (default: 0)
 # See https://docs.scrapy.org/en/latest/topics/settings.html#download-delay
@@ -29,9 +30,75 @@ ROBOTSTXT_OBEY = False
 # The download delay setting will honor only one of:
 # CONCURRENT_REQUESTS_PER_DOMAIN = 16
 # CONCURRENT_REQUESTS_PER_IP = 16
+# Starting concurrency for every host, tuned per host by AdaptiveThrottleMiddleware
+CONCURRENT_REQUESTS_PER_DOMAIN = 2
 RETRY_TIMES = 0
 DOWNLOAD_TIMEOUT = 15
 
+# PDF text extraction runs in a process pool off the reactor thread
+# PDF_WORKERS = 0 uses one worker per CPU core
+PDF_WORKERS = 0
+# Seconds to wait for a single PDF before skipping it
+PDF_TIMEOUT = 120
+# PDFs larger than this are not downloaded (0 disables the limit)
+PDF_MAX_BYTES = 25 * 1024 * 1024
+# Two-stage PDF extraction: scan each page's raw text for dates and admission
+# terms, then convert only matching pages (plus neighbours) to markdown
+PDF_PREFILTER_ENABLED = True
+PDF_PREFILTER_NEIGHBOUR_PAGES = 1
+# Maximum pages converted per document (0 disables the cap)
+PDF_PREFILTER_MAX_PAGES = 12
+
+# Extracted PDF text and its date contexts are cached by SHA-256 of the PDF
+# bytes, shared across pages and runs. Hits and misses are counted in the
+# pdf_cache/* crawl stats. Bump PDF_CACHE_ANALYSIS_VERSION after changing
+# extract_context so cached contexts are recomputed from the cached text.
+PDF_CACHE_ENABLED = True
+PDF_CACHE_PATH = "pdf_cache.sqlite"
+PDF_CACHE_MAX_BYTES = 512 * 1024 * 1024
+PDF_CACHE_ANALYSIS_VERSION = 2
+
+# HTML cleaning and context extraction run in a "page analysis executor"
+# Modes: "inline" (reactor thread), "thread" or "process"
+PAGE_ANALYSIS_MODE = "process"
+# PAGE_ANALYSIS_WORKERS = 0 uses the executor default worker count
+PAGE_ANALYSIS_WORKERS = 0
+
+# HTML text extraction backend: "lxml" walks the tree Scrapy already parsed,
+# "bs4" re-serializes the body and re-parses it with BeautifulSoup (html.parser).
+# The parsed tree can't be sent to a worker process, so with
+# PAGE_ANALYSIS_MODE = "process" the lxml walk runs on the reactor thread;
+# "thread" mode runs it in the executor.
+# Compare them with `python -m benchmarks.html_cleaner`.
+HTML_CLEANER_BACKEND = "lxml"
+
+# Lines of cleaned page text that a host repeats on many pages (header, nav,
+# tickers, footer) are stripped before context extraction. A line counts as
+# template once seen on SITE_TEMPLATES_MIN_PAGES pages of a host and on at
+# least SITE_TEMPLATES_MIN_RATIO of them; it is still kept on the first page
+# it was seen on. Templates are persisted and only stripped from the next
+# run on, so every page of a run is stripped the same way.
+# Lines under SITE_TEMPLATES_MIN_LINE_WORDS words, or holding nothing but
+# dates and admission terms, are never stripped.
+# Removed lines are counted in the site_templates/lines_removed crawl stat.
+SITE_TEMPLATES_ENABLED = True
+SITE_TEMPLATES_PATH = "site_templates.sqlite"
+SITE_TEMPLATES_MIN_PAGES = 3
+SITE_TEMPLATES_MIN_RATIO = 0.5
+SITE_TEMPLATES_MAX_AGE_DAYS = 30
+SITE_TEMPLATES_MAX_LINES_PER_HOST = 5000
+SITE_TEMPLATES_MIN_LINE_WORDS = 3
+
+# How extract_context finds near-duplicate date contexts: "exact" compares
+# each context with every kept one (SequenceMatcher ratio, with length and
+# character-count prefilters), "minhash" only compares contexts that share an
+# LSH bucket, which is near-linear but may keep an occasional duplicate.
+# Compare them with `python -m benchmarks.extract_context`.
+CONTEXT_SIMILARITY_INDEX = "exact"
+
+# multiprocessing start method for worker pools, None uses the platform default
+WORKER_MP_START_METHOD = None
+
 # FEEDS setting is causing both spiders to write to uni.jsonl
 # Comment out or remove the FEEDS setting
 # FEEDS = {
@@ -62,6 +129,117 @@ DOWNLOAD_TIMEOUT = 15
 # DOWNLOADER_MIDDLEWARES = {
 #    "admission_scraper.middlewares.AdmissionScraperDownloaderMiddleware": 543,
 # }
+DOWNLOADER_MIDDLEWARES = {
+    # Serves requests from the archive before anything else runs (replay only)
+    "admission_scraper.middlewares.ResponseReplayMiddleware": 50,
+    # Runs before HttpCompressionMiddleware (590) on requests and after it on
+    # responses, so body hashes are computed on the decompressed body
+    "admission_scraper.middlewares.ConditionalRevalidationMiddleware": 560,
+    # Sees 304s and unchanged bodies before revalidation drops them
+    "admission_scraper.middlewares.FrontierMiddleware": 570,
+    # Archives decompressed bodies before revalidation can drop unchanged ones
+    "admission_scraper.middlewares.ResponseArchiveMiddleware": 580,
+    # Close to the downloader so it sees raw statuses and download errors
+    "admission_scraper.middlewares.AdaptiveThrottleMiddleware": 950,
+}
+
+# Per-host adaptive concurrency and delay based on latency and error rate.
+# Decisions are counted in the adaptive_throttle/* crawl stats.
+ADAPTIVE_THROTTLE_ENABLED = True
+ADAPTIVE_THROTTLE_MIN_CONCURRENCY = 1
+ADAPTIVE_THROTTLE_MAX_CONCURRENCY = 8
+# EWMA latency (seconds) below which a host may get more concurrency
+ADAPTIVE_THROTTLE_TARGET_LATENCY = 2.0
+ADAPTIVE_THROTTLE_MAX_ERROR_RATE = 0.1
+ADAPTIVE_THROTTLE_MAX_DELAY = 10.0
+ADAPTIVE_THROTTLE_SMOOTHING = 0.3
+
+# Conditional revalidation (ETag / Last-Modified / body hash) of pages and PDFs.
+# Only spiders listed here are revalidated: discovery requests (UniSpider and
+# the discovery half of CombinedSpider) must always see every homepage, so they
+# set meta["discovery"].
+REVALIDATION_ENABLED = True
+REVALIDATION_SPIDERS = ["pages", "combined"]
+REVALIDATION_STORE = "revalidation.sqlite"
+REVALIDATION_FLUSH_EVERY = 200
+
+# Persistent crawl frontier: start requests only include sites and pages that
+# are due. Pages that change get rechecked more often, static ones back off.
+# Set FRONTIER_ENABLED = False to crawl everything.
+FRONTIER_ENABLED = True
+FRONTIER_PATH = "frontier.sqlite"
+FRONTIER_MIN_INTERVAL_DAYS = 1
+FRONTIER_MAX_INTERVAL_DAYS = 30
+FRONTIER_INITIAL_INTERVAL_DAYS = 7
+
+# UniSpider's visited pages are kept as 64-bit fingerprints of the
+# canonical URL (scheme and "www." ignored). "bloom" uses a fixed-size Bloom
+# filter instead, sized for SEEN_URLS_BLOOM_CAPACITY URLs.
+SEEN_URLS_BACKEND = "set"
+SEEN_URLS_BLOOM_CAPACITY = 1_000_000
+SEEN_URLS_BLOOM_ERROR_RATE = 1e-6
+# Persist the seen set so an interrupted crawl can resume; a saved set older
+# than SEEN_URLS_MAX_AGE_HOURS is ignored so scheduled crawls start fresh.
+SEEN_URLS_PERSIST = False
+SEEN_URLS_PATH = "seen_urls.bin"
+SEEN_URLS_MAX_AGE_HOURS = 12
+
+# Page items are written by PageOutputPipeline to pages.<format>:
+# "jsonl.gz" (gzip JSON lines), "parquet" (zstd, dictionary-encoded
+# url/site/source_type columns; requires pyarrow) or "jsonl" (uncompressed).
+PAGE_OUTPUT_FORMAT = "jsonl.gz"
+PAGE_OUTPUT_BATCH_SIZE = 500
+PAGE_OUTPUT_SPIDERS = ["pages", "combined", "replay"]
+
+# Sharded crawls (python main.py --shard-count N) split institutes between
+# shards by a hash of their domain. Each shard writes uni/pages files and
+# stores with a .shard-<index>-of-<count> suffix; see utils/sharding.py.
+SHARD_INDEX = 0
+SHARD_COUNT = 1
+
+# Content-addressed archive of page and PDF responses (gzip bodies + SQLite
+# index), used by `python main.py --replay` to re-run extraction offline
+RESPONSE_ARCHIVE_ENABLED = True
+RESPONSE_ARCHIVE_SPIDERS = ["pages", "combined"]
+RESPONSE_ARCHIVE_DIR = "response_archive"
+# Enabled by ReplaySpider.custom_settings, never globally
+RESPONSE_REPLAY_ENABLED = False
+
+# LLM extraction in main.py. Pages are processed on LLM_MAX_WORKERS threads,
+# each holding up to two database connections (keep it within the pool size
+# in db/session.py). Gemini calls from all workers share one token bucket
+# per quota; a 429 only backs off the worker that got it. Defaults are the
+# gemini-2.0-flash paid tier 1 limits; 0 disables a limit.
+LLM_MAX_WORKERS = 4
+LLM_REQUESTS_PER_MINUTE = 2000
+LLM_TOKENS_PER_MINUTE = 4_000_000
+# Persistent cache of parsed Gemini results keyed by a hash of the model,
+# system prompt, response schema, URL and context, so unchanged contexts
+# are not sent again. `python main.py --no-llm-cache` bypasses it for a run.
+LLM_CACHE_ENABLED = True
+LLM_CACHE_PATH = "llm_cache.sqlite"
+LLM_CACHE_TTL_DAYS = 30
+LLM_CACHE_MAX_SIZE_MB = 200
+# Send the contexts of one page together, up to this many estimated input
+# tokens and items per request, with one announcements list per item in the
+# response. A batch that fails is retried one context per request. 0 sends
+# every context on its own.
+LLM_BATCH_MAX_TOKENS = 8000
+LLM_BATCH_MAX_ITEMS = 20
+# Keep the system prompt in a Gemini cached context for this many seconds
+# (extended while the run lasts, deleted at the end), so each request only
+# sends the text chunk. Falls back to sending the prompt when the model
+# rejects it, e.g. for being below the minimum cached size. 0 disables.
+LLM_CONTEXT_CACHE_TTL_SECONDS = 3600
+# Batch jobs for large backfills (`python main.py --llm-batch submit`, later
+# `python main.py --llm-batch collect`): requests are sent through the Gemini
+# batch API, at most LLM_BATCH_JOB_MAX_REQUESTS per job, and tracked in
+# LLM_BATCH_JOBS_PATH until their results are stored. The "local" backend is
+# a stand-in that answers in LLM_BATCH_JOB_LOCAL_DIR without network.
+LLM_BATCH_JOB_BACKEND = "gemini"
+LLM_BATCH_JOBS_PATH = "llm_batch_jobs.sqlite"
+LLM_BATCH_JOB_LOCAL_DIR = "llm_batch_local"
+LLM_BATCH_JOB_MAX_REQUESTS = 10000
 
 # Enable or disable extensions
 # See https://docs.scrapy.org/en/latest/topics/extensions.html
@@ -72,6 +250,7 @@ DOWNLOAD_TIMEOUT = 15
 # Configure item pipelines
 # See https://docs.scrapy.org/en/latest/topics/item-pipeline.html
 ITEM_PIPELINES = {
+    "admission_scraper.pipelines.PageOutputPipeline": 800,
     # "admission_scraper.pipelines.SpiderSpecificOutputPipeline": 800,
     # "admission_scraper.pipelines.DebugOutputPipeline": 400,
 }
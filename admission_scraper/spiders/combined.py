@@ -0,0 +1,76 @@
+import json
+import scrapy
+from admission_scraper.spiders.pages import PagesSpider
+from admission_scraper.spiders.uni import UniSpider
+from admission_scraper.utils.url import url_key
+
+
+class CombinedSpider(UniSpider, PagesSpider):
+    """
+    Run discovery (UniSpider) and page extraction (PagesSpider) in one crawl.
+
+    Every link matched by UniSpider.parse is queued straight away as a page
+    extraction request, so extraction starts as soon as the first homepage
+    is parsed instead of waiting for the whole of uni.jsonl.
+
+    Only page items are exported (by PageOutputPipeline). Pass
+    ``-a uni_output=uni.jsonl`` to also write the discovery records for debugging.
+    """
+
+    name = "combined"
+
+    def __init__(self, *args, uni_output=None, **kwargs):
+        super(CombinedSpider, self).__init__(*args, **kwargs)
+        self.queued_links = set()
+        self.uni_output = uni_output
+        self.uni_file = None
+
+    def start_requests(self):
+        if self.uni_output:
+            self.uni_file = open(self.uni_output, "w", encoding="utf-8")
+        yield from UniSpider.start_requests(self)
+
+        # Known pages whose site was not due for discovery this run
+        if self.frontier is not None:
+            for url, site in self.frontier.due_pages():
+                yield from self.queue_links(site, [url])
+
+    def parse(self, response):
+        for result in UniSpider.parse(self, response):
+            if isinstance(result, scrapy.Request):
+                yield result
+                continue
+
+            if self.uni_file:
+                self.uni_file.write(json.dumps(result, ensure_ascii=False) + "\n")
+
+            yield from self.queue_links(result["site"], result["matched_links"])
+
+    def page_request(self, url):
+        # Discovery may request the same URL at depth 1, which would make the
+        # dupefilter drop the extraction request; queue_links dedups pages
+        return PagesSpider.page_request(self, url).replace(dont_filter=True)
+
+    def queue_links(self, site, links):
+        for link in links:
+            # A page already queued from another site still gets that site
+            # attributed to any items it has not emitted yet
+            key = url_key(link)
+            sites = self.link_sites.setdefault(key, [])
+            if site not in sites:
+                sites.append(site)
+
+            if key in self.queued_links:
+                continue
+            if self.frontier is not None and not self.frontier.is_due(link):
+                continue
+            self.queued_links.add(key)
+            self.urls.append(link)
+            yield self.page_request(link)
+
+    def closed(self, reason):
+        # Shuts down the worker pools and closes the frontier
+        PagesSpider.closed(self, reason)
+        self.visited_urls.close()
+        if self.uni_file:
+            self.uni_file.close()
@@ -3,7 +3,7 @@ import pandas as pd
 from db.session import get_db
 from db.models import Institute
 from db.data import get_institute_from_website
-from admission_scraper.utils import remove_trailing_slash
+from admission_scraper.utils.url import canonicalize_url
 
 
 def get_sites():
@@ -25,7 +25,7 @@ class FixUrlSpider(scrapy.Spider):
     def parse(self, response):
         original_url = response.meta.get("original_url")
 
-        ins = get_institute_from_website(self.db, remove_trailing_slash(original_url))
+        ins = get_institute_from_website(self.db, canonicalize_url(original_url))
         # if (ins is not None) and (ins.website != response.url):
         #     print(f"Updating URL for {ins.name} from {ins.website} to {response.url}")
         #     ins.website = response.url
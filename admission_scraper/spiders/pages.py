@@ -1,26 +1,36 @@
 import scrapy
 import pandas as pd
-import re
-from admission_scraper.utils import (
-    remove_trailing_slash,
+from admission_scraper.utils import generate_content_hash
+from admission_scraper.utils.page import (
+    clean_body_content,
+    clean_body_element,
+    extract_context,
 )
-from admission_scraper.utils.page import clean_body_content, extract_context
 import random
 import os
 import io
-from admission_scraper.utils.pdf import extract_text_from_pdf_bytes
-from bs4 import BeautifulSoup
-
-
-def getUrls() -> list[str]:
+import json
+from admission_scraper.utils.executor import PageAnalysisExecutor
+from admission_scraper.utils.frontier import open_frontier
+from admission_scraper.utils.matcher import AdmissionMatcher
+from admission_scraper.utils.pdf import PdfExtractionPool
+from admission_scraper.utils.pdf_cache import PdfTextCache
+from admission_scraper.utils.revalidation import hash_body
+from admission_scraper.utils.sharding import shard_path, shard_suffix
+from admission_scraper.utils.similarity import SIMILARITY_INDEXES
+from admission_scraper.utils.templates import open_site_templates
+from admission_scraper.utils.url import canonicalize_url, url_key
+
+
+def getUrls(path="uni.jsonl") -> list[str]:
     try:
         # Check if file exists first
-        if not os.path.exists("uni.jsonl"):
-            print("Warning: uni.jsonl file not found")
+        if not os.path.exists(path):
+            print(f"Warning: {path} file not found")
             return []
 
         # Open the file and use StringIO to avoid FutureWarning
-        with open("uni.jsonl", "r", encoding="utf-8") as f:
+        with open(path, "r", encoding="utf-8") as f:
             content = f.read()
 
         # Process only if file has content
@@ -28,172 +38,343 @@ def getUrls() -> list[str]:
             df = pd.read_json(io.StringIO(content), lines=True)
             urls = df["matched_links"].tolist()
             urls = [url for sublist in urls for url in sublist]
-            urls = list(set(urls))
+            # One URL per page, whatever scheme/www variant each site linked
+            urls = list({url_key(url): url for url in urls}.values())
             random.shuffle(urls)
             return urls
         else:
-            print("uni.jsonl file is empty")
+            print(f"{path} file is empty")
             return []
     except Exception as e:
         # More detailed error handling
-        print(f"Error reading uni.jsonl: {e}")
+        print(f"Error reading {path}: {e}")
         return []
 
 
-def get_site_from_link(link):
+def get_link_site_index(path="uni.jsonl") -> dict[str, list[str]]:
+    """Map the url_key of every matched link in a uni.jsonl file to the sites it was found on."""
     try:
         # Check if file exists first
-        if not os.path.exists("uni.jsonl"):
-            print("Warning: uni.jsonl file not found in get_site_from_link")
-            return None
-
-        # Open the file and use StringIO to avoid FutureWarning
-        with open("uni.jsonl", "r", encoding="utf-8") as f:
-            content = f.read()
-
-        if not content.strip():
-            print("uni.jsonl file is empty in get_site_from_link")
-            return None
-
-        data = pd.read_json(io.StringIO(content), lines=True)
-
-        for _, row in data.iterrows():
-            if link in row["matched_links"]:
-                return row["site"]
-
-        return None
+        if not os.path.exists(path):
+            print(f"Warning: {path} file not found in get_link_site_index")
+            return {}
+
+        index: dict[str, list[str]] = {}
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                row = json.loads(line)
+                site = row.get("site")
+                for link in row.get("matched_links") or []:
+                    sites = index.setdefault(url_key(link), [])
+                    if site not in sites:
+                        sites.append(site)
+
+        if not index:
+            print(f"{path} file is empty in get_link_site_index")
+        return index
     except Exception as e:
-        print(f"Error finding site for link {link}: {e}")
-        return None
-
-
-admission_terms = r"(?:admission|apply|application|deadline|enroll|registration|enrollment|notice|notification|admit)"
+        print(f"Error building link to site index: {e}")
+        return {}
+
+
+admission_terms = [
+    "admission",
+    "apply",
+    "application",
+    "deadline",
+    "enroll",
+    "registration",
+    "enrollment",
+    "notice",
+    "notification",
+    "admit",
+]
 date_pattern = (
     r"(?:\b(?:\d{1,2}[-./]\d{1,2}[-./](?:\d{4}|\d{2}))\b|"
     + r"\b(?:\d{1,2}[- ]?(?:Jan(?:uary)?|Feb(?:ruary)?|Mar(?:ch)?|Apr(?:il)?|May|Jun(?:e)?|Jul(?:y)?|Aug(?:ust)?|Sep(?:tember)?|Oct(?:ober)?|Nov(?:ember)?|Dec(?:ember)?)[- ]?\d{2,4})\b|"
     + r"\b(?:\d{4}[-./]\d{1,2}[-./]\d{1,2})\b)"
 )
-word_pattern = rf"\b{admission_terms}s?\b"
+matcher = AdmissionMatcher(date_pattern, admission_terms)
+word_pattern = matcher.word_pattern
+
+
+def analyze_text(text, similarity_index="exact"):
+    """
+    Extract date contexts from already cleaned text, keeping only those that
+    are not phone numbers and mention an admission term. Runs in a worker.
+    """
+    scan = matcher.scan(text)
+    date_matches = extract_context(
+        text, date_pattern, matches=scan.dates, similarity_index=similarity_index
+    )
+    return [
+        date_match
+        for date_match in date_matches
+        if not matcher.is_phone(date_match["match"])
+        and scan.has_term_between(date_match["start_char"], date_match["end_char"])
+    ]
 
 
 class PagesSpider(scrapy.Spider):
     name = "pages"
-    custom_settings = {
-        "FEEDS": {"pages.jsonl": {"format": "jsonlines", "overwrite": True}}
-    }
+    # Runs after UniSpider, whose frontier fetches are staged in the same crawl
+    clears_staged_fetches = False
 
     def __init__(self, *args, **kwargs):
         super(PagesSpider, self).__init__(*args, **kwargs)
         self.counter = 0
+        self.urls: list[str] = []
+        self.link_sites: dict[str, list[str]] = {}
+        self.pdf_pool = PdfExtractionPool()
+        self.page_executor = PageAnalysisExecutor(mode="inline")
+        self.frontier = None
+        self.pdf_cache = None
+        self.site_templates = None
+        self.seen_pdf_hashes = set()
+        self.analysis_key = generate_content_hash(f"{date_pattern}:{word_pattern}")
+        self.html_cleaner = "lxml"
+        self.similarity_index = "exact"
+        self.shard_index = 0
+        self.shard_count = 1
+        self.shard_suffix = ""
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super(PagesSpider, cls).from_crawler(crawler, *args, **kwargs)
+        settings = crawler.settings
+        spider.shard_index = settings.getint("SHARD_INDEX", 0)
+        spider.shard_count = settings.getint("SHARD_COUNT", 1)
+        spider.shard_suffix = shard_suffix(spider.shard_index, spider.shard_count)
+        spider.pdf_pool = PdfExtractionPool(
+            max_workers=settings.getint("PDF_WORKERS") or None,
+            timeout=settings.getfloat("PDF_TIMEOUT", 120),
+            max_bytes=settings.getint("PDF_MAX_BYTES", 0),
+            start_method=settings.get("WORKER_MP_START_METHOD"),
+            prefilter=(
+                {
+                    "date_pattern": date_pattern,
+                    "word_pattern": word_pattern,
+                    "neighbours": settings.getint("PDF_PREFILTER_NEIGHBOUR_PAGES", 1),
+                    "max_pages": settings.getint("PDF_PREFILTER_MAX_PAGES", 12),
+                }
+                if settings.getbool("PDF_PREFILTER_ENABLED")
+                else None
+            ),
+        )
+        spider.page_executor = PageAnalysisExecutor(
+            mode=settings.get("PAGE_ANALYSIS_MODE", "process"),
+            max_workers=settings.getint("PAGE_ANALYSIS_WORKERS") or None,
+            start_method=settings.get("WORKER_MP_START_METHOD"),
+        )
+        spider.html_cleaner = settings.get("HTML_CLEANER_BACKEND", "lxml")
+        if spider.html_cleaner not in ("lxml", "bs4"):
+            raise ValueError(
+                f"Invalid HTML_CLEANER_BACKEND {spider.html_cleaner!r}, expected 'lxml' or 'bs4'"
+            )
+        spider.similarity_index = settings.get("CONTEXT_SIMILARITY_INDEX", "exact")
+        if spider.similarity_index not in SIMILARITY_INDEXES:
+            raise ValueError(
+                f"Invalid CONTEXT_SIMILARITY_INDEX {spider.similarity_index!r}, "
+                f"expected one of {tuple(SIMILARITY_INDEXES)}"
+            )
+        if spider.frontier is None:
+            spider.frontier = open_frontier(settings, spider.clears_staged_fetches)
+        spider.site_templates = open_site_templates(settings, matcher)
+        if settings.getbool("PDF_CACHE_ENABLED"):
+            spider.pdf_cache = PdfTextCache(
+                settings.get("PDF_CACHE_PATH", "pdf_cache.sqlite"),
+                settings.getint("PDF_CACHE_MAX_BYTES", 0),
+            )
+            spider.pdf_cache.open()
+        # Cached contexts are only reused if they were computed the same way
+        spider.analysis_key = generate_content_hash(
+            f"{date_pattern}:{word_pattern}:{settings.get('PDF_CACHE_ANALYSIS_VERSION', 1)}"
+            f":{spider.similarity_index}"
+        )
+        return spider
+
+    def closed(self, reason):
+        self.pdf_pool.shutdown()
+        self.page_executor.shutdown()
+        if self.frontier is not None:
+            self.frontier.close()
+        if self.pdf_cache is not None:
+            self.pdf_cache.close()
+        if self.site_templates is not None:
+            self.site_templates.close()
 
     def start_requests(self):
-        self.urls = getUrls()
+        # Each shard reads the links its own UniSpider run discovered
+        uni_path = shard_path("uni.jsonl", self.shard_index, self.shard_count)
+        self.urls = getUrls(uni_path)
+        self.link_sites = get_link_site_index(uni_path)
+
+        if self.frontier is not None:
+            # Pages seen in earlier runs stay scheduled even when their site
+            # was not due for discovery this time
+            known = {url_key(url) for url in self.urls}
+            for url, site in self.frontier.due_pages():
+                if url_key(url) not in known:
+                    self.urls.append(url)
+                    self.link_sites.setdefault(url_key(url), [site])
+            total = len(self.urls)
+            self.urls = self.frontier.due(self.urls)
+            print(f"{len(self.urls)} of {total} pages are due for a crawl")
 
         for url in self.urls:
-            yield scrapy.Request(
-                url=url, callback=self.parse, meta={"original_url": url}
+            yield self.page_request(url)
+
+    def page_request(self, url):
+        return scrapy.Request(
+            url=url,
+            callback=self.parse_page,
+            meta={
+                "original_url": url,
+                "frontier": "page",
+                "frontier_site": self.get_sites_for_link(url)[0],
+            },
+        )
+
+    def get_sites_for_link(self, link) -> list[str]:
+        """Return every site that linked to this page, or [None] if unknown."""
+        return self.link_sites.get(url_key(link)) or [None]
+
+    def build_items(self, response, date_matches, source_type):
+        """Build one item per accepted date context (see analyze_text) and site."""
+        if not date_matches:
+            return
+        sites = self.get_sites_for_link(response.meta.get("original_url"))
+        for date_match in date_matches:
+            for site in sites:
+                yield {
+                    "url": canonicalize_url(response.url),
+                    "site": site,
+                    "date": date_match["match"],
+                    "context": date_match["context"],
+                    "related_dates": date_match.get("related_dates", []),
+                    "source_type": source_type,
+                }
+
+    async def get_pdf_date_matches(self, response):
+        """
+        Return the date contexts of a PDF, reusing cached text and contexts
+        when the same bytes were seen before. Returns None for PDFs already
+        processed in this crawl, so the same document is never emitted twice.
+        """
+        stats = self.crawler.stats
+        pdf_hash = hash_body(response.body)
+        if pdf_hash in self.seen_pdf_hashes:
+            stats.inc_value("pdf_cache/duplicate", spider=self)
+            return None
+        self.seen_pdf_hashes.add(pdf_hash)
+
+        # Text extracted with different prefilter settings is a different entry
+        cache_key = f"{pdf_hash}:{self.pdf_pool.extraction_key}"
+        cached = (
+            self.pdf_cache.get(cache_key, self.analysis_key) if self.pdf_cache else None
+        )
+        if cached is not None and cached["date_matches"] is not None:
+            stats.inc_value("pdf_cache/hit", spider=self)
+            return cached["date_matches"]
+
+        if cached is not None:
+            # Text is cached but the contexts were computed differently
+            stats.inc_value("pdf_cache/text_hit", spider=self)
+            pdf_text = cached["text"]
+        else:
+            stats.inc_value("pdf_cache/miss", spider=self)
+            pdf_text = await self.pdf_pool.extract(response.body, response.url)
+            if not pdf_text:
+                return None
+
+        date_matches = await self.page_executor.run(
+            analyze_text, pdf_text, self.similarity_index
+        )
+        if self.pdf_cache is not None:
+            evicted = self.pdf_cache.put(
+                cache_key, pdf_text, self.analysis_key, date_matches
             )
+            if evicted:
+                stats.inc_value("pdf_cache/evicted", evicted, spider=self)
+        return date_matches
 
-    def parse(self, response):
+    async def parse_page(self, response):
         if response.url.lower().endswith(
             ".pdf"
         ) or "application/pdf" in response.headers.get("Content-Type", b"").decode(
             "utf-8", "ignore"
         ):
             print(f"\nProcessing PDF: {response.url}\n")
-            pdf_text = extract_text_from_pdf_bytes(response.body)
-            if not pdf_text:
+            date_matches = await self.get_pdf_date_matches(response)
+            if not date_matches:
                 return
 
-            date_matches = extract_context(pdf_text, date_pattern)
-
-            if len(date_matches) != 0:
-                for date_match in date_matches:
-                    if not is_likely_phone_number(date_match["match"]):
-                        word_matches = re.findall(
-                            word_pattern, date_match["context"], re.IGNORECASE
-                        )
-                        if word_matches:
-                            site = get_site_from_link(response.meta.get("original_url"))
-                            yield {
-                                "url": remove_trailing_slash(response.url),
-                                "site": site,
-                                "date": date_match["match"],
-                                "context": date_match["context"],
-                                "related_dates": date_match.get("related_dates", []),
-                                "source_type": "pdf",
-                            }
+            for item in self.build_items(response, date_matches, "pdf"):
+                yield item
 
             print(f"processed PDF: {response.url}")
             return
 
         self.counter += 1
-        pdf_link_tags = response.css("a[href$='.pdf']").getall()
-        for link_tag in pdf_link_tags:
-            soup = BeautifulSoup(link_tag, "html.parser")
-            link_href = soup.a.get("href") if soup.a else ""
-            text = soup.a.get_text() if soup.a else ""
+        for link_tag in response.css("a[href$='.pdf']"):
+            link_href = link_tag.attrib.get("href", "")
+            text = link_tag.xpath("string()").get()
             if not link_href:
                 continue
-            text_matches = re.findall(word_pattern, text, re.IGNORECASE)
-            url_matches = re.findall(word_pattern, str(link_href), re.IGNORECASE)
-            word_matches = [*text_matches, *url_matches]
-            if word_matches:
+            if matcher.has_term(text) or matcher.has_term(str(link_href)):
                 yield scrapy.Request(
                     url=str(link_href),
-                    callback=self.parse,
+                    callback=self.parse_page,
                     meta={
                         "original_url": response.meta.get("original_url"),
                         "is_pdf": True,
+                        "download_maxsize": self.pdf_pool.max_bytes,
                     },
                 )
 
-        body_content = response.css("body").get()
-        if not body_content:
-            return
-
-        cleaned_body_content = clean_body_content(body_content)
-
-        date_matches = extract_context(cleaned_body_content, date_pattern)
-
-        if len(date_matches) != 0:
-            for date_match in date_matches:
-                if not is_likely_phone_number(date_match["match"]):
-                    word_matches = re.findall(
-                        word_pattern, date_match["context"], re.IGNORECASE
-                    )
-                    if word_matches:
-                        site = get_site_from_link(response.meta.get("original_url"))
-                        yield {
-                            "url": remove_trailing_slash(response.url),
-                            "site": site,
-                            "date": date_match["match"],
-                            "context": date_match["context"],
-                            "related_dates": date_match.get("related_dates", []),
-                            "source_type": "html",
-                        }
+        if self.html_cleaner == "lxml":
+            # Walk the tree Scrapy already parsed (read only, so a worker
+            # thread can walk it too)
+            body = response.css("body")
+            if not body:
+                return
+            if self.page_executor.mode == "process":
+                # The tree can't be sent to a worker process, walk it here
+                cleaned_body_content = clean_body_element(body[0].root)
+            else:
+                cleaned_body_content = await self.page_executor.run(
+                    clean_body_element, body[0].root
+                )
+        else:
+            body_content = response.css("body").get()
+            if not body_content:
+                return
 
-        print("processed", self.counter, "from", len(self.urls), "urls")
+            cleaned_body_content = await self.page_executor.run(
+                clean_body_content, body_content
+            )
 
+        if self.site_templates is not None:
+            # Drop the header/nav/footer lines this host repeats on every page
+            cleaned_body_content, removed = self.site_templates.strip(
+                response.url, cleaned_body_content
+            )
+            if removed:
+                self.crawler.stats.inc_value(
+                    "site_templates/lines_removed", removed, spider=self
+                )
+        date_matches = await self.page_executor.run(
+            analyze_text, cleaned_body_content, self.similarity_index
+        )
+        for item in self.build_items(response, date_matches, "html"):
+            yield item
 
-def is_likely_phone_number(text):
-    phone_patterns = [
-        r"\d+/\d+/\d+/\d+",  # Pattern like 8200/1/2/3
-        r"\d+-\d+-\d+",  # Pattern like 91-72-820
-        r"\d{4}-\d{2,3}-\d{2,4}",  # Common phone format with hyphens
-        r"\d{10,}",  # Any sequence of 10+ digits (most dates won't have this many)
-    ]
+        print("processed", self.counter, "from", len(self.urls), "urls")
 
-    # Date-specific validation
-    month_names = r"Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec"
-    looks_like_date = bool(
-        re.search(rf"\b({month_names})\b", text, re.IGNORECASE)
-        or re.search(r"\b\d{4}\b", text)
-    )  # Has a 4-digit year
+    parse = parse_page
 
-    # Check against phone patterns
-    for pattern in phone_patterns:
-        if re.search(pattern, text):
-            return True
 
-    return not looks_like_date
+def is_likely_phone_number(text):
+    return matcher.is_phone(text)
@@ -0,0 +1,49 @@
+import scrapy
+from admission_scraper.spiders.pages import PagesSpider
+from admission_scraper.utils.response_store import ResponseStore
+from admission_scraper.utils.url import url_key
+
+
+class ReplaySpider(PagesSpider):
+    """
+    Re-run PagesSpider extraction against the response archive with no
+    network access. Start requests are the latest archived version of every
+    page; PDFs linked from those pages are served from the archive too.
+    """
+
+    name = "replay"
+    custom_settings = {
+        "RESPONSE_REPLAY_ENABLED": True,
+        "RESPONSE_ARCHIVE_ENABLED": False,
+        "REVALIDATION_ENABLED": False,
+        "ADAPTIVE_THROTTLE_ENABLED": False,
+        "FRONTIER_ENABLED": False,
+        # A replay must not change the templates learned from live crawls
+        "SITE_TEMPLATES_ENABLED": False,
+    }
+
+    def start_requests(self):
+        store = ResponseStore(
+            self.settings.get("RESPONSE_ARCHIVE_DIR", "response_archive")
+        )
+        store.open()
+        try:
+            entries = [entry for entry in store.iter_latest() if not entry["meta"]["is_pdf"]]
+        finally:
+            store.close()
+
+        seen = set()
+        for entry in entries:
+            original_url = entry["meta"]["original_url"] or entry["request_url"]
+            if entry["meta"]["sites"]:
+                self.link_sites[url_key(original_url)] = entry["meta"]["sites"]
+            # Redirected pages are indexed under every URL in the chain
+            if original_url in seen:
+                continue
+            seen.add(original_url)
+            self.urls.append(original_url)
+
+        for url in self.urls:
+            yield scrapy.Request(
+                url=url, callback=self.parse_page, meta={"original_url": url}
+            )
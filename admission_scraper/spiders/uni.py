@@ -1,6 +1,10 @@
 import scrapy
 from scrapy.linkextractors.lxmlhtml import LxmlLinkExtractor
-from admission_scraper.utils import remove_trailing_slash
+from admission_scraper.utils.frontier import open_frontier
+from admission_scraper.utils.matcher import term_pattern
+from admission_scraper.utils.seen_urls import SeenUrlSet, open_seen_urls
+from admission_scraper.utils.sharding import shard_of, shard_suffix
+from admission_scraper.utils.url import canonicalize_url, url_key
 from db.session import get_db
 from db.data import get_all_institutes
 
@@ -22,47 +26,96 @@ admission_terms = [
     # "degree",
     "enrollment",
 ]
-word_pattern = r"\b(?:" + "|".join(admission_terms) + r")s?\b"
+word_pattern = term_pattern(admission_terms)
 
 
 class UniSpider(scrapy.Spider):
     name = "uni"
+    # First spider of a crawl: drops frontier fetches an earlier crawl staged
+    clears_staged_fetches = True
     link_extractor = LxmlLinkExtractor(
         canonicalize=True, unique=True, allow=word_pattern
     )
     custom_settings = {
-        "FEEDS": {"uni.jsonl": {"format": "jsonlines", "overwrite": True}}
+        "FEEDS": {
+            "uni%(shard_suffix)s.jsonl": {"format": "jsonlines", "overwrite": True}
+        }
     }
 
     def __init__(self, *args, **kwargs):
         super(UniSpider, self).__init__(*args, **kwargs)
-        self.visited_urls = set()
+        self.visited_urls = SeenUrlSet()
+        self.frontier = None
+        self.shard_index = 0
+        self.shard_count = 1
+        self.shard_suffix = ""
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super(UniSpider, cls).from_crawler(crawler, *args, **kwargs)
+        spider.visited_urls = open_seen_urls(crawler.settings)
+        spider.shard_index = crawler.settings.getint("SHARD_INDEX", 0)
+        spider.shard_count = crawler.settings.getint("SHARD_COUNT", 1)
+        spider.shard_suffix = shard_suffix(spider.shard_index, spider.shard_count)
+        if spider.frontier is None:
+            spider.frontier = open_frontier(crawler.settings, spider.clears_staged_fetches)
+        return spider
+
+    def closed(self, reason):
+        self.visited_urls.close()
+        if self.frontier is not None:
+            self.frontier.close()
 
     def start_requests(self):
         urls = get_sites()
+        if self.shard_count > 1:
+            urls = [
+                url for url in urls if shard_of(url, self.shard_count) == self.shard_index
+            ]
+            print(
+                f"Shard {self.shard_index} of {self.shard_count}: {len(urls)} sites"
+            )
+        if self.frontier is not None:
+            total = len(urls)
+            urls = self.frontier.due(urls)
+            print(f"{len(urls)} of {total} sites are due for a crawl")
+
         for url in urls:
             yield scrapy.Request(
                 url=url,
                 callback=self.parse,
-                meta={"original_url": url, "depth": 0},
+                meta={
+                    "original_url": url,
+                    "depth": 0,
+                    "discovery": True,
+                    "frontier": "site",
+                    "frontier_site": url,
+                },
             )
 
     def parse(self, response):
         original_url = response.meta.get("original_url")
         current_depth = response.meta.get("depth", 0)
-        current_url = remove_trailing_slash(response.url)
+        current_url = canonicalize_url(response.url)
 
         if current_url in self.visited_urls:
             return
         self.visited_urls.add(current_url)
 
         matched_links = []
+        matched_keys = set()
 
         for link in self.link_extractor.extract_links(response):
-            clean_link_url = remove_trailing_slash(link.url)
+            clean_link_url = canonicalize_url(link.url)
 
+            # Skip pages already crawled and scheme/www variants of links
+            # already matched on this page
             if clean_link_url in self.visited_urls:
                 continue
+            link_key = url_key(clean_link_url)
+            if link_key in matched_keys:
+                continue
+            matched_keys.add(link_key)
 
             matched_links.append(clean_link_url)
             print(f"Found matches {response.url} - '{link.url}'")
@@ -74,6 +127,7 @@ class UniSpider(scrapy.Spider):
                     meta={
                         "original_url": original_url,
                         "depth": 1,
+                        "discovery": True,
                     },
                 )
 
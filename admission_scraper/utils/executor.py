@@ -0,0 +1,61 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+
+class PageAnalysisExecutor:
+    """
+    Run CPU-heavy page analysis (HTML cleaning, context extraction) away
+    from the reactor thread.
+
+    Modes:
+        inline: call the function directly on the reactor thread
+        thread: run it in a ThreadPoolExecutor
+        process: run it in a ProcessPoolExecutor (function and arguments must be picklable)
+    """
+
+    MODES = ("inline", "thread", "process")
+
+    def __init__(self, mode="process", max_workers=None, start_method=None):
+        if mode not in self.MODES:
+            raise ValueError(
+                f"Invalid page analysis mode {mode!r}, expected one of {self.MODES}"
+            )
+        self.mode = mode
+        self.max_workers = max_workers
+        self.start_method = start_method
+        self.executor = None
+
+    def get_executor(self):
+        if self.executor is None:
+            if self.mode == "thread":
+                self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
+            else:
+                mp_context = (
+                    multiprocessing.get_context(self.start_method)
+                    if self.start_method
+                    else None
+                )
+                self.executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers, mp_context=mp_context
+                )
+        return self.executor
+
+    async def run(self, func, *args):
+        """Run func(*args) according to the configured mode and return its result."""
+        if self.mode == "inline":
+            return func(*args)
+
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self.get_executor(), func, *args)
+        except BrokenProcessPool:
+            # A worker died; start a fresh pool and retry once
+            self.executor = None
+            return await loop.run_in_executor(self.get_executor(), func, *args)
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
@@ -0,0 +1,256 @@
+import os
+import sqlite3
+from datetime import datetime
+from zoneinfo import ZoneInfo
+from admission_scraper.utils.page import should_update
+from admission_scraper.utils.url import url_key
+
+
+class CrawlFrontier:
+    """
+    Persistent record of every site and page URL we crawl, used to decide
+    which URLs are due for a recrawl.
+
+    Each URL keeps its last fetch, last change, fetch/change counts and a
+    recrawl interval in days. A change halves the interval, an unchanged
+    fetch grows it by half, bounded by min_interval and max_interval.
+
+    Fetches seen during a crawl are only staged. commit() applies them once
+    the pages were stored, so a page whose processing failed stays due.
+    """
+
+    def __init__(
+        self,
+        path="frontier.sqlite",
+        min_interval=1,
+        max_interval=30,
+        initial_interval=7,
+        flush_every=200,
+    ):
+        self.path = path
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.initial_interval = initial_interval
+        self.flush_every = flush_every
+        self.entries = {}
+        self.pending = set()
+        self.staged = {}
+        self.conn = None
+
+    def open(self, clear_staged=False):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS frontier (
+                url TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                site TEXT,
+                body_hash TEXT,
+                last_fetch TEXT,
+                last_change TEXT,
+                fetch_count INTEGER NOT NULL DEFAULT 0,
+                change_count INTEGER NOT NULL DEFAULT 0,
+                interval_days REAL NOT NULL
+            )
+            """
+        )
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS staged_fetches (
+                url TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                site TEXT,
+                body_hash TEXT,
+                page_key TEXT NOT NULL,
+                fetched_at TEXT NOT NULL
+            )
+            """
+        )
+        if clear_staged:
+            # Left over from a crawl whose pages were never processed
+            self.conn.execute("DELETE FROM staged_fetches")
+        self.conn.commit()
+        for row in self.conn.execute(
+            """
+            SELECT url, kind, site, body_hash, last_fetch, last_change,
+                   fetch_count, change_count, interval_days
+            FROM frontier
+            """
+        ):
+            url, kind, site, body_hash, last_fetch, last_change = row[:6]
+            self.entries[url] = {
+                "kind": kind,
+                "site": site,
+                "body_hash": body_hash,
+                "last_fetch": datetime.fromisoformat(last_fetch) if last_fetch else None,
+                "last_change": (
+                    datetime.fromisoformat(last_change) if last_change else None
+                ),
+                "fetch_count": row[6],
+                "change_count": row[7],
+                "interval_days": row[8],
+            }
+
+    def is_due(self, url):
+        entry = self.entries.get(url)
+        if entry is None:
+            return True
+        return should_update(entry["last_fetch"], entry["interval_days"])
+
+    def due(self, urls):
+        """Filter urls down to the ones that were never fetched or are due."""
+        return [url for url in urls if self.is_due(url)]
+
+    def due_pages(self):
+        """Return (url, site) for every known page that is due for a recrawl."""
+        return [
+            (url, entry["site"])
+            for url, entry in self.entries.items()
+            if entry["kind"] == "page" and self.is_due(url)
+        ]
+
+    def record(self, url, kind, site, body_hash, page_url=None):
+        """
+        Stage a successful fetch (see commit()). body_hash is None when the
+        server answered 304 Not Modified, which counts as unchanged.
+        page_url is the URL the page's items are stored under, when it was
+        redirected.
+        """
+        now = datetime.now(ZoneInfo("Asia/Kolkata"))
+        self.staged[url] = (kind, site, body_hash, url_key(page_url or url), now.isoformat())
+        if len(self.staged) >= self.flush_every:
+            self.flush()
+
+    def apply(self, url, kind, site, body_hash, now):
+        """Update the entry of url with a fetch made at now."""
+        entry = self.entries.get(url)
+        if entry is None:
+            entry = {
+                "kind": kind,
+                "site": site,
+                "body_hash": body_hash,
+                "last_fetch": now,
+                "last_change": now,
+                "fetch_count": 1,
+                "change_count": 1,
+                "interval_days": self.initial_interval,
+            }
+        else:
+            changed = body_hash is not None and body_hash != entry["body_hash"]
+            entry["fetch_count"] += 1
+            entry["last_fetch"] = now
+            if changed:
+                entry["body_hash"] = body_hash
+                entry["last_change"] = now
+                entry["change_count"] += 1
+                entry["interval_days"] = max(
+                    self.min_interval, entry["interval_days"] / 2
+                )
+            else:
+                entry["interval_days"] = min(
+                    self.max_interval, entry["interval_days"] * 1.5
+                )
+            entry["site"] = site or entry["site"]
+
+        self.entries[url] = entry
+        self.pending.add(url)
+
+    def commit(self, skip_pages=(), only_pages=None):
+        """
+        Apply the staged fetches, except those of pages whose url_key() is
+        in skip_pages (pages that were not stored), which stay staged and
+        are due again. With only_pages, only fetches of those pages are
+        applied. Returns the number of fetches applied.
+        """
+        self.flush()
+        applied = []
+        for url, kind, site, body_hash, page_key, fetched_at in self.conn.execute(
+            "SELECT * FROM staged_fetches ORDER BY fetched_at"
+        ):
+            if only_pages is not None and page_key not in only_pages:
+                continue
+            if page_key in skip_pages:
+                if url not in self.entries:
+                    # Keep a page only this crawl discovered scheduled
+                    self.entries[url] = {
+                        "kind": kind,
+                        "site": site,
+                        "body_hash": None,
+                        "last_fetch": None,
+                        "last_change": None,
+                        "fetch_count": 0,
+                        "change_count": 0,
+                        "interval_days": self.initial_interval,
+                    }
+                    self.pending.add(url)
+                continue
+            self.apply(url, kind, site, body_hash, datetime.fromisoformat(fetched_at))
+            applied.append(url)
+        self.write_entries()
+        self.conn.executemany(
+            "DELETE FROM staged_fetches WHERE url = ?", [(url,) for url in applied]
+        )
+        self.conn.commit()
+        return len(applied)
+
+    def flush(self):
+        if not self.staged or self.conn is None:
+            return
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO staged_fetches VALUES (?, ?, ?, ?, ?, ?)",
+            [(url, *fetch) for url, fetch in self.staged.items()],
+        )
+        self.conn.commit()
+        self.staged = {}
+
+    def write_entries(self):
+        if not self.pending:
+            return
+        rows = []
+        for url in self.pending:
+            entry = self.entries[url]
+            rows.append(
+                (
+                    url,
+                    entry["kind"],
+                    entry["site"],
+                    entry["body_hash"],
+                    entry["last_fetch"].isoformat() if entry["last_fetch"] else None,
+                    entry["last_change"].isoformat() if entry["last_change"] else None,
+                    entry["fetch_count"],
+                    entry["change_count"],
+                    entry["interval_days"],
+                )
+            )
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO frontier VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows
+        )
+        self.conn.commit()
+        self.pending = set()
+
+    def close(self):
+        self.flush()
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+def open_frontier(settings, clear_staged=False, path=None):
+    """
+    Create and open the frontier configured in settings (at path instead of
+    FRONTIER_PATH if given), or None if disabled. clear_staged drops
+    fetches staged by an earlier crawl.
+    """
+    if not settings.getbool("FRONTIER_ENABLED"):
+        return None
+    frontier = CrawlFrontier(
+        path or settings.get("FRONTIER_PATH", "frontier.sqlite"),
+        min_interval=settings.getfloat("FRONTIER_MIN_INTERVAL_DAYS", 1),
+        max_interval=settings.getfloat("FRONTIER_MAX_INTERVAL_DAYS", 30),
+        initial_interval=settings.getfloat("FRONTIER_INITIAL_INTERVAL_DAYS", 7),
+    )
+    frontier.open(clear_staged)
+    return frontier
@@ -0,0 +1,83 @@
+import re
+from bisect import bisect_left
+from functools import lru_cache
+
+
+def term_pattern(terms):
+    """Build a whole-word regex for a list of terms, allowing a plural 's'."""
+    return r"\b(?:" + "|".join(terms) + r")s?\b"
+
+
+PHONE_PATTERNS = [
+    r"\d+/\d+/\d+/\d+",  # Pattern like 8200/1/2/3
+    r"\d+-\d+-\d+",  # Pattern like 91-72-820
+    r"\d{4}-\d{2,3}-\d{2,4}",  # Common phone format with hyphens
+    r"\d{10,}",  # Any sequence of 10+ digits (most dates won't have this many)
+]
+MONTH_NAMES = r"Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec"
+WORD_REGEX = re.compile(r"\w")
+
+
+class MatchScan:
+    """Result of AdmissionMatcher.scan over one document."""
+
+    def __init__(self, dates, term_starts):
+        self.dates = dates
+        self.term_starts = term_starts
+
+    def has_term_between(self, start, end):
+        """Check whether an admission term starts within text[start:end]."""
+        i = bisect_left(self.term_starts, start)
+        return i < len(self.term_starts) and self.term_starts[i] < end
+
+
+class AdmissionMatcher:
+    """
+    Precompiled matcher for dates, admission terms and phone-number filtering.
+
+    scan() finds dates and admission terms in a single pass over the text
+    (terms never overlap dates, so one alternation gives the same matches as
+    two separate scans). Phone-number verdicts are computed with two
+    combined regexes instead of one search per pattern, and memoized.
+
+    Args:
+        date_pattern: Case-sensitive regex for dates
+        terms: Admission terms, matched case-insensitively as whole words
+    """
+
+    def __init__(self, date_pattern, terms):
+        self.date_pattern = date_pattern
+        self.word_pattern = term_pattern(terms)
+        self.date_regex = re.compile(date_pattern)
+        self.term_regex = re.compile(self.word_pattern, re.IGNORECASE)
+        self.scan_regex = re.compile(
+            rf"(?P<date>{date_pattern})|(?P<term>(?i:{self.word_pattern}))"
+        )
+        self.phone_regex = re.compile("|".join(PHONE_PATTERNS))
+        self.date_hint_regex = re.compile(
+            rf"(?i:\b(?:{MONTH_NAMES})\b)|\b\d{{4}}\b"  # Has a month name or 4-digit year
+        )
+        self.is_phone = lru_cache(maxsize=4096)(self._is_phone)
+
+    def scan(self, text):
+        dates = []
+        term_starts = []
+        for match in self.scan_regex.finditer(text):
+            if match.lastgroup == "date":
+                dates.append(match)
+            else:
+                term_starts.append(match.start())
+        return MatchScan(dates, term_starts)
+
+    def has_term(self, text):
+        return self.term_regex.search(text) is not None
+
+    def only_matches(self, text):
+        """Check whether text has dates or admission terms and no other words."""
+        rest, found = self.scan_regex.subn("", text)
+        return found > 0 and WORD_REGEX.search(rest) is None
+
+    def _is_phone(self, text):
+        if self.phone_regex.search(text):
+            return True
+        return self.date_hint_regex.search(text) is None
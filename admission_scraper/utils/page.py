@@ -1,8 +1,10 @@
 from bs4 import BeautifulSoup
 import re
+from bisect import bisect_right
 from difflib import SequenceMatcher
 from datetime import datetime
 from zoneinfo import ZoneInfo
+from admission_scraper.utils.similarity import make_similarity_index
 
 
 def similarity(a, b):
@@ -18,36 +20,23 @@ def should_update(last_update, refresh_days=7):
     return age.days >= refresh_days
 
 
-def extract_context(
-    text,
-    regex_pattern,
-    before=50,
-    after=50,
-    similarity_threshold=0.7,
-    max_char_distance=500,
-):
+def build_token_index(text):
     """
-    Extract context around regex matches with intelligent clustering and deduplication.
-
-    Args:
-        text: The full text to search in
-        regex_pattern: The regex pattern to match (typically dates)
-        before: Number of tokens to include before the match
-        after: Number of tokens to include after the match
-        similarity_threshold: Threshold for considering contexts as similar
-        max_char_distance: Maximum character distance to consider dates as part of the same cluster
-
-    Returns:
-        List of dictionaries with match and context information
+    Split text into whitespace-separated tokens (same tokens as text.split())
+    and record the character offset where each one starts and ends.
     """
-    # Find all matches of the regex in the text
-    matches = list(re.finditer(regex_pattern, text))
-    if not matches:
-        return []
-
-    # First, cluster matches that are close to each other
-    matches.sort(key=lambda x: x.start())
-
+    tokens = []
+    starts = []
+    ends = []
+    for match in re.finditer(r"\S+", text):
+        tokens.append(match.group())
+        starts.append(match.start())
+        ends.append(match.end())
+    return tokens, starts, ends
+
+
+def cluster_matches(matches, max_char_distance):
+    """Group sorted matches whose gap to the previous match is under max_char_distance."""
     clusters = []
     current_cluster = [matches[0]]
 
@@ -64,7 +53,12 @@ def extract_context(
     if current_cluster:
         clusters.append(current_cluster)
 
-    # Process each cluster to extract a unified context
+    return clusters
+
+
+def build_cluster_contexts(clusters, token_index, before, after):
+    """Turn each cluster into a token-window context using a prebuilt token index."""
+    tokens, starts, ends = token_index
     cluster_results = []
 
     for cluster in clusters:
@@ -72,32 +66,16 @@ def extract_context(
         cluster_start = cluster[0].start()
         cluster_end = cluster[-1].end()
 
-        # Convert to token-based positions for more consistent context extraction
-        tokens = text.split()
-        token_positions = []
-        char_count = 0
-
-        for token in tokens:
-            token_positions.append(char_count)
-            char_count += len(token) + 1  # +1 for the space
-
-        # Find token indices for cluster boundaries
-        token_start = 0
-        token_end = 0
-
-        for i, pos in enumerate(token_positions):
-            if pos <= cluster_start:
-                token_start = i
-            if pos <= cluster_end:
-                token_end = i
+        # Last tokens starting at or before the cluster boundaries
+        token_start = max(0, bisect_right(starts, cluster_start) - 1)
+        token_end = max(0, bisect_right(starts, cluster_end) - 1)
 
         # Calculate the range for extraction with padding
         extract_start = max(0, token_start - before)
         extract_end = min(len(tokens), token_end + after)
 
         # Extract the tokens and join them back into a string
-        context_tokens = tokens[extract_start:extract_end]
-        context_text = " ".join(context_tokens)
+        context_text = " ".join(tokens[extract_start:extract_end])
 
         # Get all dates in this cluster
         dates = [match.group() for match in cluster]
@@ -110,35 +88,91 @@ def extract_context(
                 "context": context_text,
                 "start_token": extract_start,
                 "end_token": extract_end,
+                "start_char": starts[extract_start] if extract_end > extract_start else 0,
+                "end_char": ends[extract_end - 1] if extract_end > extract_start else 0,
             }
         )
 
+    return cluster_results
+
+
+def extract_context(
+    text,
+    regex_pattern,
+    before=50,
+    after=50,
+    similarity_threshold=0.7,
+    max_char_distance=500,
+    matches=None,
+    token_index=None,
+    similarity_index="exact",
+):
+    """
+    Extract context around regex matches with intelligent clustering and deduplication.
+
+    Args:
+        text: The full text to search in
+        regex_pattern: The regex pattern to match (typically dates)
+        before: Number of tokens to include before the match
+        after: Number of tokens to include after the match
+        similarity_threshold: Threshold for considering contexts as similar
+        max_char_distance: Maximum character distance to consider dates as part of the same cluster
+        matches: Precomputed matches of regex_pattern in text (e.g. from AdmissionMatcher.scan)
+        token_index: Precomputed build_token_index(text), shared across calls on the same text
+        similarity_index: How near-duplicate contexts are found, "exact" (same
+            result as comparing every pair) or "minhash" (approximate, for pages
+            with very many clusters); see admission_scraper.utils.similarity
+
+    Returns:
+        List of dictionaries with match and context information. start_char and
+        end_char give the span of the context in text.
+    """
+    # Find all matches of the regex in the text
+    if matches is None:
+        matches = list(re.finditer(regex_pattern, text))
+    else:
+        matches = list(matches)
+    if not matches:
+        return []
+
+    # First, cluster matches that are close to each other
+    matches.sort(key=lambda x: x.start())
+    clusters = cluster_matches(matches, max_char_distance)
+
+    # Process each cluster to extract a unified context
+    if token_index is None:
+        token_index = build_token_index(text)
+    cluster_results = build_cluster_contexts(clusters, token_index, before, after)
+
     # Now perform semantic deduplication on the cluster results
     deduplicated_results = []
+    index = make_similarity_index(similarity_index, similarity_threshold)
 
     for result in cluster_results:
         # Check if this result is semantically similar to any existing one
-        is_duplicate = False
-
-        for existing in deduplicated_results:
-            if (
-                similarity(result["context"], existing["context"])
-                > similarity_threshold
-            ):
-                # This is a duplicate based on context similarity
-                # We can either merge or skip. Here we'll merge dates but keep the most comprehensive context
-                existing["all_dates"] = list(
-                    set(existing["all_dates"] + result["all_dates"])
-                )
-
-                # Keep the most comprehensive context (longer one)
-                if len(result["context"]) > len(existing["context"]):
-                    existing["context"] = result["context"]
-
-                is_duplicate = True
-                break
-
-        if not is_duplicate:
+        duplicate_of = index.find(result["context"])
+
+        if duplicate_of is not None:
+            # This is a duplicate based on context similarity
+            # We can either merge or skip. Here we'll merge dates but keep the most comprehensive context
+            existing = deduplicated_results[duplicate_of]
+            existing["all_dates"] = list(
+                set(existing["all_dates"] + result["all_dates"])
+            )
+
+            # Keep the most comprehensive context (longer one) along with its span
+            if len(result["context"]) > len(existing["context"]):
+                for key in (
+                    "context",
+                    "start_token",
+                    "end_token",
+                    "start_char",
+                    "end_char",
+                ):
+                    existing[key] = result[key]
+                index.replace(duplicate_of, existing["context"])
+        else:
+            index.add(len(deduplicated_results), result["context"])
             deduplicated_results.append(result)
 
     # For compatibility with existing code, create individual entries for each date
@@ -152,6 +186,8 @@ def extract_context(
             "context": result["context"],
             "start_token": result["start_token"],
             "end_token": result["end_token"],
+            "start_char": result["start_char"],
+            "end_char": result["end_char"],
             "related_dates": result["all_dates"],
         }
         final_results.append(primary_entry)
@@ -175,6 +211,45 @@ def clean_body_content(body_content):
     return cleaned_content
 
 
+# Elements dropped (with their text) before extracting page text
+REMOVED_TAGS = {"script", "style", "a", "iframe"}
+# BeautifulSoup's get_text() leaves out strings inside these tags
+HIDDEN_TEXT_TAGS = {"template", "rt", "rp"}
+
+
+def iter_element_text(element, hidden=False):
+    """Yield the text nodes of an lxml element in document order, like BeautifulSoup's _all_strings."""
+    # Comments and processing instructions have a non-string tag; their
+    # tail text is yielded by the parent
+    if not isinstance(element.tag, str):
+        return
+    if element.tag in REMOVED_TAGS:
+        return
+
+    hidden = hidden or element.tag in HIDDEN_TEXT_TAGS
+    if element.text and not hidden:
+        yield element.text
+    # libxml2 caps HTML nesting depth, so recursion stays well within limits
+    for child in element:
+        yield from iter_element_text(child, hidden)
+        if child.tail and not hidden:
+            yield child.tail
+
+
+def clean_body_element(body_element):
+    """
+    Same output as clean_body_content, computed from an already parsed lxml
+    element (e.g. response.css("body")[0].root) without re-serializing and
+    re-parsing it. The tree is not modified.
+    """
+    cleaned_content = "\n".join(iter_element_text(body_element))
+    cleaned_content = "\n".join(
+        line.strip() for line in cleaned_content.splitlines() if line.strip()
+    )
+
+    return cleaned_content
+
+
 def extract_semantic_sections(text):
     """Extract semantic sections (paragraphs) from text."""
     # Split text into paragraphs using blank lines as separators
@@ -1,5 +1,13 @@
+import asyncio
+import hashlib
 import io
+import json
+import multiprocessing
+import os
+import re
 import requests
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 import pdfplumber
 import pymupdf
 import pymupdf4llm
@@ -16,24 +24,82 @@ def download_pdf(url):
         return None
 
 
-def extract_text_from_pdf_bytes(pdf_bytes):
-    """Extract text content from PDF bytes using in-memory approach"""
+# Bump when select_relevant_pages picks pages differently, so PDF text
+# cached by an older selection is extracted again
+PAGE_SELECTION_VERSION = 2
+
+
+def select_relevant_pages(doc, date_pattern, word_pattern, neighbours=1, max_pages=10):
+    """
+    Cheap first pass over a PDF: scan each page's raw text for dates and
+    admission terms and return the 0-based page numbers worth converting.
+
+    Pages containing both a date and an admission term are ranked by number
+    of dates and selected first, then their neighbouring pages (so contexts
+    crossing a page break survive), nearest first, until max_pages is
+    reached. A neighbour never takes the place of a matching page.
+    """
+    date_regex = re.compile(date_pattern)
+    word_regex = re.compile(word_pattern, re.IGNORECASE)
+
+    candidates = []
+    for page_number, page in enumerate(doc):
+        page_text = page.get_text()
+        if not word_regex.search(page_text):
+            continue
+        date_count = sum(1 for _ in date_regex.finditer(page_text))
+        if date_count:
+            candidates.append((date_count, page_number))
+
+    candidates.sort(key=lambda x: (-x[0], x[1]))
+    ranked = [page_number for _, page_number in candidates]
+    if max_pages:
+        ranked = ranked[:max_pages]
+    selected = set(ranked)
+    for distance in range(1, neighbours + 1):
+        for page_number in ranked:
+            for neighbour in (page_number - distance, page_number + distance):
+                if max_pages and len(selected) >= max_pages:
+                    return sorted(selected)
+                if 0 <= neighbour < doc.page_count:
+                    selected.add(neighbour)
+
+    return sorted(selected)
+
+
+def extract_text_from_pdf_bytes(pdf_bytes, prefilter=None):
+    """
+    Extract text content from PDF bytes using in-memory approach
+
+    Args:
+        pdf_bytes: Raw PDF document
+        prefilter: Optional dict with date_pattern, word_pattern, neighbours and
+            max_pages. When given, only pages selected by select_relevant_pages
+            are converted to markdown.
+    """
     if not pdf_bytes:
         return None
 
     try:
+        pages = None
         # Use io.BytesIO to create an in-memory file object
         with io.BytesIO(pdf_bytes) as pdf_file:
             # Try using pymupdf4llm first for better text extraction
             try:
                 doc = pymupdf.Document(stream=pdf_bytes, filetype="pdf")
-                md_text = pymupdf4llm.to_markdown(doc)
+                if prefilter:
+                    pages = select_relevant_pages(doc, **prefilter)
+                    if not pages:
+                        return None
+                md_text = pymupdf4llm.to_markdown(doc, pages=pages)
                 if md_text:
                     return md_text
             except Exception as e:
                 print(f"pymupdf4llm extraction failed, falling back to pdfplumber: {e}")
             # If pymupdf4llm returns empty text, fall back to pdfplumber
-            with pdfplumber.open(pdf_file) as pdf:
+            # pdfplumber numbers pages from 1
+            plumber_pages = [p + 1 for p in pages] if pages else None
+            with pdfplumber.open(pdf_file, pages=plumber_pages) as pdf:
                 text = ""
                 for page in pdf.pages:
                     page_text = page.extract_text() or ""
@@ -43,3 +109,111 @@ def extract_text_from_pdf_bytes(pdf_bytes):
     except Exception as e:
         print(f"Error extracting text from PDF: {e}")
         return None
+
+
+class PdfExtractionPool:
+    """
+    Run extract_text_from_pdf_bytes in a bounded process pool so that slow
+    PDFs never block the reactor thread.
+
+    Args:
+        max_workers: Number of worker processes (defaults to the CPU count)
+        timeout: Seconds to wait for a single PDF before giving up on it
+        max_bytes: PDFs larger than this are skipped without being parsed
+        start_method: multiprocessing start method, None for the platform default
+        prefilter: Page prefilter options passed to extract_text_from_pdf_bytes
+    """
+
+    def __init__(
+        self,
+        max_workers=None,
+        timeout=120,
+        max_bytes=0,
+        start_method=None,
+        prefilter=None,
+    ):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self.start_method = start_method
+        self.prefilter = prefilter
+        self.executor = None
+        self.slots = None
+
+    @property
+    def extraction_key(self):
+        """Describe how text is extracted, so cached text from other settings isn't reused."""
+        if not self.prefilter:
+            return "full"
+        return hashlib.sha256(
+            json.dumps([self.prefilter, PAGE_SELECTION_VERSION], sort_keys=True).encode()
+        ).hexdigest()[:16]
+
+    def get_executor(self):
+        if self.executor is None:
+            mp_context = (
+                multiprocessing.get_context(self.start_method)
+                if self.start_method
+                else None
+            )
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.max_workers, mp_context=mp_context
+            )
+        return self.executor
+
+    async def extract(self, pdf_bytes, url=""):
+        """Extract text from PDF bytes in a worker process, or None on failure."""
+        if not pdf_bytes:
+            return None
+        if self.max_bytes and len(pdf_bytes) > self.max_bytes:
+            print(f"Skipping PDF larger than {self.max_bytes} bytes: {url}")
+            return None
+
+        if self.slots is None:
+            # No more PDFs in flight than workers, so the timeout only runs
+            # while a worker is on the PDF, not while it waits in the queue
+            self.slots = asyncio.Semaphore(self.max_workers or os.cpu_count() or 1)
+        loop = asyncio.get_running_loop()
+        async with self.slots:
+            for attempt in range(2):
+                executor = self.get_executor()
+                try:
+                    future = loop.run_in_executor(
+                        executor, extract_text_from_pdf_bytes, pdf_bytes, self.prefilter
+                    )
+                    return await asyncio.wait_for(future, self.timeout)
+                except asyncio.TimeoutError:
+                    # A hung worker would hold its slot forever, so replace the
+                    # pool. Other PDFs in it fail with BrokenProcessPool and retry.
+                    print(
+                        f"Timed out extracting PDF after {self.timeout}s, restarting pool: {url}"
+                    )
+                    self.recycle(executor)
+                    return None
+                except BrokenProcessPool as e:
+                    # A worker died (this PDF or another one); start a fresh
+                    # pool and retry once
+                    self.recycle(executor)
+                    if attempt:
+                        print(f"PDF worker crashed on {url}: {e}")
+                        return None
+
+    def recycle(self, executor):
+        """Stop executor's workers; the next extract() starts a new pool."""
+        if self.executor is executor:
+            self.executor = None
+        # shutdown() does not stop a worker stuck in a document
+        terminate_workers = getattr(executor, "terminate_workers", None)
+        if terminate_workers is not None:
+            terminate_workers()
+        else:
+            for process in list((executor._processes or {}).values()):
+                process.terminate()
+        # Queued PDFs are not cancelled: they fail with BrokenProcessPool
+        # and are retried on the new pool
+        executor.shutdown(wait=False)
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
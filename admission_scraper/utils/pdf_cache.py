@@ -0,0 +1,117 @@
+import json
+import os
+import sqlite3
+import time
+
+
+class PdfTextCache:
+    """
+    Persistent cache of extracted PDF text keyed by the SHA-256 of the PDF bytes.
+
+    Alongside the markdown it stores the extract_context results computed
+    from it, tagged with an analysis key (a fingerprint of the date pattern
+    and analysis version) so results are only reused when they would be
+    computed the same way. The least recently used entries are evicted once
+    the stored text exceeds max_bytes.
+    """
+
+    def __init__(self, path="pdf_cache.sqlite", max_bytes=512 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.conn = None
+
+    def open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS pdf_text (
+                pdf_hash TEXT PRIMARY KEY,
+                text TEXT NOT NULL,
+                analysis_key TEXT,
+                date_matches TEXT,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self.conn.commit()
+        self.total_bytes = self.conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM pdf_text"
+        ).fetchone()[0]
+
+    def get(self, pdf_hash, analysis_key):
+        """
+        Return {"text", "date_matches"} for a cached PDF, or None on a miss.
+        date_matches is None when it was computed with a different analysis key.
+        """
+        row = self.conn.execute(
+            "SELECT text, analysis_key, date_matches FROM pdf_text WHERE pdf_hash = ?",
+            (pdf_hash,),
+        ).fetchone()
+        if row is None:
+            return None
+
+        self.conn.execute(
+            "UPDATE pdf_text SET last_access = ? WHERE pdf_hash = ?",
+            (time.time(), pdf_hash),
+        )
+        self.conn.commit()
+        text, stored_key, date_matches = row
+        return {
+            "text": text,
+            "date_matches": (
+                json.loads(date_matches)
+                if date_matches is not None and stored_key == analysis_key
+                else None
+            ),
+        }
+
+    def put(self, pdf_hash, text, analysis_key, date_matches):
+        """Store extracted text and its date contexts, returning the number of evictions."""
+        size = len(text.encode("utf-8"))
+        previous = self.conn.execute(
+            "SELECT size FROM pdf_text WHERE pdf_hash = ?", (pdf_hash,)
+        ).fetchone()
+        self.conn.execute(
+            "INSERT OR REPLACE INTO pdf_text VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                pdf_hash,
+                text,
+                analysis_key,
+                json.dumps(date_matches),
+                size,
+                time.time(),
+            ),
+        )
+        self.total_bytes += size - (previous[0] if previous else 0)
+        evicted = self.evict()
+        self.conn.commit()
+        return evicted
+
+    def evict(self):
+        if not self.max_bytes or self.total_bytes <= self.max_bytes:
+            return 0
+
+        # Evict down to 90% of the limit so we don't evict on every insert
+        target = self.max_bytes * 0.9
+        evicted = 0
+        rows = self.conn.execute(
+            "SELECT pdf_hash, size FROM pdf_text ORDER BY last_access"
+        ).fetchall()
+        for pdf_hash, size in rows:
+            if self.total_bytes <= target:
+                break
+            self.conn.execute("DELETE FROM pdf_text WHERE pdf_hash = ?", (pdf_hash,))
+            self.total_bytes -= size
+            evicted += 1
+        return evicted
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.commit()
+            self.conn.close()
+            self.conn = None
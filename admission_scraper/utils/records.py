@@ -0,0 +1,250 @@
+import gzip
+import json
+import os
+import tempfile
+import zlib
+
+# Output formats by file extension. Parquet needs pyarrow, which is only
+# imported when a .parquet file is written or read.
+RECORD_FORMATS = {
+    "jsonl": ".jsonl",
+    "jsonl.gz": ".jsonl.gz",
+    "parquet": ".parquet",
+}
+
+# Columns of page items that repeat across rows and are dictionary-encoded
+# in Parquet output
+PAGE_DICTIONARY_COLUMNS = ["url", "site", "source_type"]
+
+
+def record_path(name, output_format):
+    """File name for a record file: record_path("pages", "jsonl.gz") -> pages.jsonl.gz"""
+    if output_format not in RECORD_FORMATS:
+        raise ValueError(
+            f"Invalid output format {output_format!r}, expected one of {tuple(RECORD_FORMATS)}"
+        )
+    return f"{name}{RECORD_FORMATS[output_format]}"
+
+
+def page_schema():
+    import pyarrow as pa
+
+    return pa.schema(
+        [
+            ("url", pa.string()),
+            ("site", pa.string()),
+            ("date", pa.string()),
+            ("context", pa.string()),
+            ("related_dates", pa.list_(pa.string())),
+            ("source_type", pa.string()),
+        ]
+    )
+
+
+class JsonLinesWriter:
+    """Writes records as JSON lines, gzip-compressed when the path ends in .gz."""
+
+    def __init__(self, path):
+        self.path = path
+        self.tmp_path = f"{path}.tmp"
+        if path.endswith(".gz"):
+            self.file = gzip.open(self.tmp_path, "wt", compresslevel=6, encoding="utf-8")
+        else:
+            self.file = open(self.tmp_path, "w", encoding="utf-8")
+
+    def write(self, records):
+        self.file.write(
+            "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+        )
+
+    def close(self):
+        self.file.close()
+        os.replace(self.tmp_path, self.path)
+
+
+class ParquetWriter:
+    """
+    Writes records to a Parquet file, one row group per write() call.
+    Only dictionary_columns are dictionary-encoded. Without a schema it is
+    inferred from the first batch.
+    """
+
+    def __init__(self, path, schema=None, dictionary_columns=None):
+        self.path = path
+        self.tmp_path = f"{path}.tmp"
+        self.schema = schema
+        self.dictionary_columns = dictionary_columns or False
+        self.writer = None
+
+    def write(self, records):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if not records:
+            return
+        table = pa.Table.from_pylist(records, schema=self.schema)
+        if self.writer is None:
+            self.schema = table.schema
+            use_dictionary = self.dictionary_columns
+            if use_dictionary:
+                use_dictionary = [
+                    column for column in use_dictionary if column in self.schema.names
+                ]
+            self.writer = pq.ParquetWriter(
+                self.tmp_path,
+                self.schema,
+                compression="zstd",
+                use_dictionary=use_dictionary,
+            )
+        self.writer.write_table(table)
+
+    def close(self):
+        import pyarrow.parquet as pq
+
+        if self.writer is None:
+            # No records: still leave a valid, empty file behind
+            if self.schema is None:
+                return
+            self.writer = pq.ParquetWriter(self.tmp_path, self.schema)
+        self.writer.close()
+        os.replace(self.tmp_path, self.path)
+
+
+def read_record_schema(path):
+    """Arrow schema of a Parquet record file, None for JSON lines files."""
+    if not path.endswith(".parquet"):
+        return None
+    import pyarrow.parquet as pq
+
+    return pq.read_schema(path)
+
+
+def open_record_writer(path, schema=None, dictionary_columns=None):
+    """Open a writer for path, choosing the format from its extension."""
+    if path.endswith(".parquet"):
+        return ParquetWriter(path, schema, dictionary_columns)
+    return JsonLinesWriter(path)
+
+
+def iter_record_batches(path, batch_size=1000):
+    """
+    Stream a record file (.jsonl, .jsonl.gz or .parquet) as lists of at most
+    batch_size dicts, without loading the whole file.
+    """
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size):
+            yield batch.to_pylist()
+        return
+
+    opener = gzip.open if path.endswith(".gz") else open
+    batch = []
+    with opener(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            batch.append(json.loads(line))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def iter_records(path, batch_size=1000):
+    """Stream the records of a record file one by one."""
+    for batch in iter_record_batches(path, batch_size):
+        yield from batch
+
+
+class SpillPartitions:
+    """
+    Temporary JSON lines files that records are hash-partitioned into by
+    key, so every record of a key ends up in the same partition, in the
+    order it was written.
+    """
+
+    def __init__(self, key, partitions=64):
+        self.key = key
+        self.partitions = partitions
+        self.directory = tempfile.TemporaryDirectory(prefix="record-groups-")
+        self.files = {}
+
+    def partition_of(self, value):
+        return zlib.crc32(str(value).encode("utf-8")) % self.partitions
+
+    def write(self, records):
+        lines = {}
+        for record in records:
+            lines.setdefault(self.partition_of(record[self.key]), []).append(
+                json.dumps(record, ensure_ascii=False) + "\n"
+            )
+        for partition, partition_lines in lines.items():
+            file = self.files.get(partition)
+            if file is None:
+                file = open(
+                    os.path.join(self.directory.name, f"{partition}.jsonl"),
+                    "w",
+                    encoding="utf-8",
+                )
+                self.files[partition] = file
+            file.write("".join(partition_lines))
+
+    def iter_partitions(self):
+        """Yield the records of each partition as a list, one partition at a time."""
+        for partition in sorted(self.files):
+            file = self.files.pop(partition)
+            file.close()
+            with open(file.name, encoding="utf-8") as f:
+                records = [json.loads(line) for line in f]
+            os.remove(file.name)
+            yield records
+
+    def close(self):
+        for file in self.files.values():
+            file.close()
+        self.files = {}
+        self.directory.cleanup()
+
+
+def group_records(records, key):
+    groups = {}
+    for record in records:
+        groups.setdefault(record[key], []).append(record)
+    return groups
+
+
+def iter_record_groups(path, key, max_records=50_000, partitions=64, batch_size=1000):
+    """
+    Stream the records of a record file grouped by key as (value, records)
+    pairs, records in file order. Groups are built in memory until more
+    than max_records have been read; larger files are spilled into
+    hash partitions on disk and grouped one partition at a time, so memory
+    stays around max(max_records, file size / partitions).
+    """
+    groups = {}
+    held = 0
+    spill = None
+    try:
+        for batch in iter_record_batches(path, batch_size):
+            if spill is not None:
+                spill.write(batch)
+                continue
+            for record in batch:
+                groups.setdefault(record[key], []).append(record)
+            held += len(batch)
+            if held > max_records:
+                spill = SpillPartitions(key, partitions)
+                for records in groups.values():
+                    spill.write(records)
+                groups = {}
+
+        if spill is None:
+            yield from groups.items()
+            return
+        for records in spill.iter_partitions():
+            yield from group_records(records, key).items()
+    finally:
+        if spill is not None:
+            spill.close()
@@ -0,0 +1,128 @@
+import gzip
+import hashlib
+import json
+import os
+import sqlite3
+from datetime import datetime
+from zoneinfo import ZoneInfo
+from admission_scraper.utils.url import url_key
+
+
+class ResponseStore:
+    """
+    Content-addressed on-disk archive of HTTP responses.
+
+    Bodies are gzip-compressed and stored once per SHA-256 under
+    ``<root>/blobs/<hash[:2]>/<hash>.gz``. Every fetch adds a row to the
+    SQLite index keyed by url_key() of the request URL and fetch time, so
+    unchanged pages only cost an index row.
+    """
+
+    # Index version: 1 keyed rows by w3lib's canonicalize_url
+    VERSION = 2
+
+    def __init__(self, root="response_archive"):
+        self.root = root
+        self.conn = None
+
+    def open(self):
+        os.makedirs(os.path.join(self.root, "blobs"), exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(self.root, "index.sqlite"))
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                url TEXT NOT NULL,
+                fetched_at TEXT NOT NULL,
+                request_url TEXT NOT NULL,
+                response_url TEXT NOT NULL,
+                status INTEGER NOT NULL,
+                headers TEXT NOT NULL,
+                body_hash TEXT NOT NULL,
+                meta TEXT NOT NULL,
+                PRIMARY KEY (url, fetched_at)
+            )
+            """
+        )
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] < self.VERSION:
+            # Re-key rows of older archives (or none, for a new one)
+            self.conn.create_function("url_key", 1, url_key, deterministic=True)
+            self.conn.execute("UPDATE OR REPLACE responses SET url = url_key(request_url)")
+            self.conn.execute(f"PRAGMA user_version = {self.VERSION}")
+        self.conn.commit()
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.commit()
+            self.conn.close()
+            self.conn = None
+
+    def blob_path(self, body_hash):
+        return os.path.join(self.root, "blobs", body_hash[:2], f"{body_hash}.gz")
+
+    def put(self, request_url, response_url, status, headers, body, meta=None):
+        """Store a response body (deduplicated by hash) and index this fetch."""
+        body_hash = hashlib.sha256(body).hexdigest()
+        path = self.blob_path(body_hash)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            with gzip.open(tmp_path, "wb") as f:
+                f.write(body)
+            os.replace(tmp_path, path)
+
+        self.conn.execute(
+            "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                url_key(request_url),
+                datetime.now(ZoneInfo("Asia/Kolkata")).isoformat(),
+                request_url,
+                response_url,
+                status,
+                json.dumps(headers),
+                body_hash,
+                json.dumps(meta or {}),
+            ),
+        )
+        self.conn.commit()
+        return body_hash
+
+    def read_body(self, body_hash):
+        with gzip.open(self.blob_path(body_hash), "rb") as f:
+            return f.read()
+
+    def latest(self, url):
+        """Return the most recent fetch of a URL as a dict (without body), or None."""
+        row = self.conn.execute(
+            """
+            SELECT request_url, response_url, status, headers, body_hash, meta
+            FROM responses WHERE url = ? ORDER BY fetched_at DESC LIMIT 1
+            """,
+            (url_key(url),),
+        ).fetchone()
+        return self.row_to_entry(row) if row else None
+
+    def iter_latest(self):
+        """Yield the most recent fetch of every archived URL."""
+        rows = self.conn.execute(
+            """
+            SELECT request_url, response_url, status, headers, body_hash, meta
+            FROM responses AS r
+            WHERE fetched_at = (
+                SELECT MAX(fetched_at) FROM responses WHERE url = r.url
+            )
+            """
+        )
+        for row in rows:
+            yield self.row_to_entry(row)
+
+    @staticmethod
+    def row_to_entry(row):
+        request_url, response_url, status, headers, body_hash, meta = row
+        return {
+            "request_url": request_url,
+            "response_url": response_url,
+            "status": status,
+            "headers": json.loads(headers),
+            "body_hash": body_hash,
+            "meta": json.loads(meta),
+        }
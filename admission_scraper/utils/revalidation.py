@@ -0,0 +1,129 @@
+import hashlib
+import os
+import sqlite3
+from datetime import datetime
+from zoneinfo import ZoneInfo
+from admission_scraper.utils.url import url_key
+
+
+class ValidatorStore:
+    """
+    Local SQLite store of HTTP validators (ETag, Last-Modified, body hash) per URL.
+
+    Rows are loaded into memory when the store is opened and written back in
+    batches, so lookups during the crawl never touch the disk.
+
+    Validators seen during a crawl are only staged. They are used for
+    revalidation once commit() is called after the pages were stored, so a
+    page whose processing failed is not dropped as unchanged next run.
+    """
+
+    def __init__(self, path="revalidation.sqlite", flush_every=200):
+        self.path = path
+        self.flush_every = flush_every
+        self.validators = {}
+        self.pending = {}
+        self.conn = None
+
+    def open(self, clear_staged=False):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(self.path)
+        for table in ("validators", "staged_validators"):
+            self.conn.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS {table} (
+                    url TEXT PRIMARY KEY,
+                    etag TEXT,
+                    last_modified TEXT,
+                    body_hash TEXT,
+                    last_checked TEXT
+                )
+                """
+            )
+        if clear_staged:
+            # Left over from a crawl whose pages were never processed
+            self.conn.execute("DELETE FROM staged_validators")
+        self.conn.commit()
+        for url, etag, last_modified, body_hash in self.conn.execute(
+            "SELECT url, etag, last_modified, body_hash FROM validators"
+        ):
+            self.validators[url] = {
+                "etag": etag,
+                "last_modified": last_modified,
+                "body_hash": body_hash,
+            }
+
+    def get(self, url):
+        return self.validators.get(url)
+
+    def set(self, url, etag, last_modified, body_hash):
+        """Stage new validators for url (see commit())."""
+        entry = {"etag": etag, "last_modified": last_modified, "body_hash": body_hash}
+        self.pending[url] = entry
+        if len(self.pending) >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        if not self.pending or self.conn is None:
+            return
+        now = datetime.now(ZoneInfo("Asia/Kolkata")).isoformat()
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO staged_validators VALUES (?, ?, ?, ?, ?)",
+            [
+                (url, e["etag"], e["last_modified"], e["body_hash"], now)
+                for url, e in self.pending.items()
+            ],
+        )
+        self.conn.commit()
+        self.pending = {}
+
+    def commit(self, skip_pages=(), only_pages=None):
+        """
+        Make the staged validators current, except those of URLs whose
+        url_key() is in skip_pages (pages that were not stored), which stay
+        staged. With only_pages, only validators of those pages are
+        committed. Returns the number of validators committed.
+        """
+        self.flush()
+        rows = [
+            row
+            for row in self.conn.execute("SELECT * FROM staged_validators")
+            if url_key(row[0]) not in skip_pages
+            and (only_pages is None or url_key(row[0]) in only_pages)
+        ]
+        self.conn.executemany(
+            """
+            INSERT INTO validators (url, etag, last_modified, body_hash, last_checked)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(url) DO UPDATE SET
+                etag = excluded.etag,
+                last_modified = excluded.last_modified,
+                body_hash = excluded.body_hash,
+                last_checked = excluded.last_checked
+            """,
+            rows,
+        )
+        self.conn.executemany(
+            "DELETE FROM staged_validators WHERE url = ?", [(row[0],) for row in rows]
+        )
+        self.conn.commit()
+        for url, etag, last_modified, body_hash, _ in rows:
+            self.validators[url] = {
+                "etag": etag,
+                "last_modified": last_modified,
+                "body_hash": body_hash,
+            }
+        return len(rows)
+
+    def close(self):
+        self.flush()
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+def hash_body(body):
+    """Generate SHA-256 hash of raw response bytes"""
+    return hashlib.sha256(body).hexdigest()
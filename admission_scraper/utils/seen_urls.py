@@ -0,0 +1,141 @@
+import hashlib
+import math
+import os
+import time
+from array import array
+from admission_scraper.utils.url import url_fingerprint, url_key
+
+
+class SeenUrlSet:
+    """
+    Set of URLs already crawled, stored as 64-bit fingerprints of url_key()
+    so http/https, www/non-www, fragment and query-order variants are the
+    same entry and memory does not grow with URL length.
+
+    With a path, the set is loaded on open() and saved on close() so an
+    interrupted crawl can resume without refetching pages. A saved set older
+    than max_age_hours is ignored, so the next scheduled crawl starts fresh
+    (which URLs are due is decided by the crawl frontier, not this set).
+    """
+
+    def __init__(self, path=None, max_age_hours=12):
+        self.path = path
+        self.max_age_hours = max_age_hours
+        self.fingerprints = set()
+
+    def __contains__(self, url):
+        return url_fingerprint(url) in self.fingerprints
+
+    def __len__(self):
+        return len(self.fingerprints)
+
+    def add(self, url):
+        self.fingerprints.add(url_fingerprint(url))
+
+    def is_fresh(self):
+        if not self.path or not os.path.exists(self.path):
+            return False
+        age_hours = (time.time() - os.path.getmtime(self.path)) / 3600
+        return not self.max_age_hours or age_hours < self.max_age_hours
+
+    def open(self):
+        if not self.is_fresh():
+            return
+        try:
+            with open(self.path, "rb") as f:
+                self.load(f.read())
+            print(f"Loaded {len(self)} seen URLs from {self.path}")
+        except (OSError, ValueError) as e:
+            print(f"Error loading seen URLs from {self.path}: {e}")
+
+    def load(self, data):
+        fingerprints = array("Q")
+        fingerprints.frombytes(data)
+        self.fingerprints.update(fingerprints)
+
+    def dump(self):
+        return array("Q", self.fingerprints).tobytes()
+
+    def close(self):
+        if not self.path:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(self.dump())
+        os.replace(tmp_path, self.path)
+
+
+class BloomSeenUrlSet(SeenUrlSet):
+    """
+    Bloom filter variant of SeenUrlSet with a fixed memory footprint sized
+    for capacity URLs at the given false positive rate (about 3.6 MB for a
+    million URLs at 1e-6). A false positive skips a URL that was never
+    crawled, so keep error_rate small.
+    """
+
+    def __init__(self, path=None, max_age_hours=12, capacity=1_000_000, error_rate=1e-6):
+        super().__init__(path, max_age_hours)
+        self.num_bits = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def positions(self, url):
+        # Double hashing: k positions from two 64-bit hashes
+        digest = hashlib.blake2b(url_key(url).encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:], "big") | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def __contains__(self, url):
+        return all(self.bits[p >> 3] & (1 << (p & 7)) for p in self.positions(url))
+
+    def __len__(self):
+        return self.count
+
+    def add(self, url):
+        new = False
+        for p in self.positions(url):
+            if not self.bits[p >> 3] & (1 << (p & 7)):
+                self.bits[p >> 3] |= 1 << (p & 7)
+                new = True
+        self.count += new
+
+    def load(self, data):
+        if len(data) != len(self.bits):
+            raise ValueError("saved filter was built with a different capacity or error rate")
+        self.bits = bytearray(data)
+        # Estimate the number of URLs from the share of bits set
+        set_bits = int.from_bytes(self.bits, "big").bit_count()
+        if set_bits < self.num_bits:
+            self.count = round(
+                -self.num_bits / self.num_hashes * math.log(1 - set_bits / self.num_bits)
+            )
+
+    def dump(self):
+        return bytes(self.bits)
+
+
+def open_seen_urls(settings):
+    """Create and open the seen-URL set configured in settings."""
+    backend = settings.get("SEEN_URLS_BACKEND", "set")
+    path = settings.get("SEEN_URLS_PATH") if settings.getbool("SEEN_URLS_PERSIST") else None
+    max_age_hours = settings.getfloat("SEEN_URLS_MAX_AGE_HOURS", 12)
+    if backend == "set":
+        seen = SeenUrlSet(path, max_age_hours)
+    elif backend == "bloom":
+        seen = BloomSeenUrlSet(
+            path,
+            max_age_hours,
+            capacity=settings.getint("SEEN_URLS_BLOOM_CAPACITY", 1_000_000),
+            error_rate=settings.getfloat("SEEN_URLS_BLOOM_ERROR_RATE", 1e-6),
+        )
+    else:
+        raise ValueError(
+            f"Invalid SEEN_URLS_BACKEND {backend!r}, expected 'set' or 'bloom'"
+        )
+    seen.open()
+    return seen
@@ -0,0 +1,96 @@
+import hashlib
+import os
+from admission_scraper.utils.records import (
+    PAGE_DICTIONARY_COLUMNS,
+    iter_record_batches,
+    open_record_writer,
+    read_record_schema,
+)
+from admission_scraper.utils.url import url_key
+
+# Settings holding files or directories that a shard must not share with
+# other shards running on the same machine
+SHARDED_PATH_SETTINGS = [
+    "FRONTIER_PATH",
+    "PDF_CACHE_PATH",
+    "REVALIDATION_STORE",
+    "RESPONSE_ARCHIVE_DIR",
+    "SEEN_URLS_PATH",
+    "SITE_TEMPLATES_PATH",
+]
+
+
+def shard_of(url, shard_count):
+    """
+    Shard (0 to shard_count - 1) that crawls a site. Based on a stable hash
+    of the host (without "www."), so every run puts a domain in the same
+    shard and per-domain politeness holds within that shard's crawler.
+    """
+    if shard_count <= 1:
+        return 0
+    host = url_key(url).split("/", 1)[0]
+    digest = hashlib.blake2b(host.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % shard_count
+
+
+def shard_suffix(shard_index, shard_count):
+    """Suffix added to per-shard file names, empty when not sharded."""
+    if shard_count <= 1:
+        return ""
+    return f".shard-{shard_index}-of-{shard_count}"
+
+
+def shard_path(path, shard_index, shard_count):
+    """Insert the shard suffix before the extension: pages.jsonl.gz -> pages.shard-0-of-4.jsonl.gz"""
+    if not path:
+        return path
+    directory, name = os.path.split(path)
+    stem, dot, ext = name.partition(".")
+    return os.path.join(directory, f"{stem}{shard_suffix(shard_index, shard_count)}{dot}{ext}")
+
+
+def apply_shard_settings(settings, shard_index, shard_count):
+    """Select a shard and give it its own stores (frontier, caches, archive)."""
+    if not 0 <= shard_index < shard_count:
+        raise ValueError(
+            f"Invalid shard index {shard_index} for {shard_count} shards"
+        )
+    settings.set("SHARD_INDEX", shard_index, priority="cmdline")
+    settings.set("SHARD_COUNT", shard_count, priority="cmdline")
+    for name in SHARDED_PATH_SETTINGS:
+        settings.set(
+            name,
+            shard_path(settings.get(name), shard_index, shard_count),
+            priority="cmdline",
+        )
+
+
+def merge_shard_outputs(path, shard_count):
+    """
+    Combine the per-shard record files of path (.jsonl, .jsonl.gz or
+    .parquet) into path, streaming them batch by batch.
+    Returns the number of records written, or None if no shard wrote the file.
+    """
+    shard_files = [
+        shard_path(path, shard_index, shard_count)
+        for shard_index in range(shard_count)
+    ]
+    existing = [shard_file for shard_file in shard_files if os.path.exists(shard_file)]
+    if not existing:
+        return None
+    for shard_file in shard_files:
+        if shard_file not in existing:
+            print(f"Warning: {shard_file} not found, merging without it")
+
+    records = 0
+    writer = open_record_writer(
+        path,
+        schema=read_record_schema(existing[0]),
+        dictionary_columns=PAGE_DICTIONARY_COLUMNS,
+    )
+    for shard_file in existing:
+        for batch in iter_record_batches(shard_file):
+            writer.write(batch)
+            records += len(batch)
+    writer.close()
+    return records
@@ -0,0 +1,168 @@
+import hashlib
+import random
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter
+from difflib import SequenceMatcher
+
+
+def shingle_hash(shingle):
+    """Stable 64-bit hash of a shingle, the same in every process and run."""
+    digest = hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+class ExactSimilarityIndex:
+    """
+    Finds the first stored text whose SequenceMatcher ratio with a query is
+    above threshold, exactly like comparing against every stored text in
+    insertion order, but skipping pairs that cannot pass.
+
+    ratio() is 2*M/(la+lb) where M, the number of matched characters, is at
+    most min(la, lb) (the length bound) and at most the size of the
+    character multiset intersection (difflib's quick_ratio). Stored texts
+    are kept sorted by length so only those inside the length bound are
+    looked at, the multiset bound is checked with precomputed character
+    counts, and the full ratio() reuses a SequenceMatcher per stored text.
+    """
+
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.entries = {}
+        self.lengths = []
+
+    def length_range(self, length):
+        """Range of lengths a text can have and still be similar to one of this length."""
+        if self.threshold <= 0:
+            return 0, float("inf")
+        if self.threshold >= 1:
+            return length, length
+        # Widened slightly so float rounding never drops a valid candidate
+        return (
+            length * self.threshold / (2 - self.threshold) * (1 - 1e-9),
+            length * (2 - self.threshold) / self.threshold * (1 + 1e-9),
+        )
+
+    def first_similar(self, text, keys):
+        """Check keys in insertion order and return the first similar one, or None."""
+        low, high = self.length_range(len(text))
+        counts = Counter(text)
+        for key in sorted(keys):
+            entry = self.entries[key]
+            if not low <= len(entry["text"]) <= high:
+                continue
+            total = len(text) + len(entry["text"])
+            if not total:
+                return key  # Two empty strings have a ratio of 1.0
+            common = sum((counts & entry["counts"]).values())
+            if 2.0 * common / total <= self.threshold:
+                continue
+            entry["matcher"].set_seq1(text)
+            if entry["matcher"].ratio() > self.threshold:
+                return key
+        return None
+
+    def find(self, text):
+        """Return the key of the earliest added text similar to text, or None."""
+        low, high = self.length_range(len(text))
+        start = bisect_left(self.lengths, (low,))
+        end = bisect_right(self.lengths, (high, float("inf")))
+        return self.first_similar(text, [key for _, key in self.lengths[start:end]])
+
+    def add(self, key, text):
+        matcher = SequenceMatcher(None)
+        matcher.set_seq2(text)
+        self.entries[key] = {"text": text, "counts": Counter(text), "matcher": matcher}
+        insort(self.lengths, (len(text), key))
+
+    def replace(self, key, text):
+        """Update the text stored under key."""
+        old = self.entries[key]["text"]
+        self.lengths.pop(bisect_left(self.lengths, (len(old), key)))
+        self.add(key, text)
+
+
+class MinHashSimilarityIndex(ExactSimilarityIndex):
+    """
+    Approximate variant of ExactSimilarityIndex for documents with many
+    contexts: candidates come from MinHash/LSH buckets over word shingles
+    instead of every stored text, then go through the same length,
+    quick_ratio and ratio() checks. It never reports a pair that is not
+    above threshold, but can miss a similar pair whose shingles share no
+    band, so results may keep a few more contexts than the exact index.
+
+    Args:
+        threshold: SequenceMatcher ratio above which texts are similar
+        num_perm: Number of MinHash permutations
+        bands: Number of LSH bands (num_perm must be a multiple of it)
+        shingle_size: Number of words per shingle
+    """
+
+    MERSENNE_PRIME = (1 << 61) - 1
+
+    def __init__(self, threshold, num_perm=64, bands=32, shingle_size=2, seed=1):
+        super().__init__(threshold)
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        rng = random.Random(seed)
+        self.permutations = [
+            (rng.randrange(1, self.MERSENNE_PRIME), rng.randrange(self.MERSENNE_PRIME))
+            for _ in range(num_perm)
+        ]
+        self.buckets = {}
+        self.entry_bands = {}
+        # Text and band keys of the last find() query, reused by add()
+        self.last_query = (None, None)
+
+    def band_keys(self, text):
+        words = text.split()
+        size = min(self.shingle_size, len(words)) or 1
+        shingles = {
+            shingle_hash(" ".join(words[i : i + size]))
+            for i in range(max(1, len(words) - size + 1))
+        }
+        signature = [
+            min((a * shingle + b) % self.MERSENNE_PRIME for shingle in shingles)
+            for a, b in self.permutations
+        ]
+        return [
+            (band, tuple(signature[band * self.rows : (band + 1) * self.rows]))
+            for band in range(len(signature) // self.rows)
+        ]
+
+    def find(self, text):
+        bands = self.band_keys(text)
+        candidates = set()
+        for band in bands:
+            candidates.update(self.buckets.get(band, ()))
+        self.last_query = (text, bands)
+        return self.first_similar(text, candidates)
+
+    def add(self, key, text):
+        super().add(key, text)
+        query_text, bands = self.last_query
+        if query_text != text:
+            bands = self.band_keys(text)
+        for band in self.entry_bands.pop(key, ()):
+            self.buckets[band].discard(key)
+        self.entry_bands[key] = bands
+        for band in bands:
+            self.buckets.setdefault(band, set()).add(key)
+
+
+SIMILARITY_INDEXES = {
+    "exact": ExactSimilarityIndex,
+    "minhash": MinHashSimilarityIndex,
+}
+
+
+def make_similarity_index(kind, threshold):
+    """Create a similarity index by name ("exact" or "minhash") or from a class."""
+    if isinstance(kind, str):
+        if kind not in SIMILARITY_INDEXES:
+            raise ValueError(
+                f"Invalid similarity index {kind!r}, expected one of {tuple(SIMILARITY_INDEXES)}"
+            )
+        kind = SIMILARITY_INDEXES[kind]
+    return kind(threshold)
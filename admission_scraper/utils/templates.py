@@ -0,0 +1,194 @@
+import hashlib
+import os
+import sqlite3
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+from admission_scraper.utils.url import url_key
+
+
+def line_hash(line):
+    """Stable signed 64-bit hash of a line (fits an SQLite INTEGER)."""
+    digest = hashlib.blake2b(line.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+class SiteTemplates:
+    """
+    Learns the lines of cleaned page text that a host repeats on many pages
+    (header, navigation, tickers, footer) and strips them before context
+    extraction.
+
+    A line becomes a template line once it was seen on min_pages pages of
+    the same host in this run and on at least min_ratio of that host's
+    pages so far. Lines shorter than min_line_words words, and lines that
+    are nothing but dates and admission terms (matcher.only_matches), are
+    never template lines: stripping them could drop the only copy of a
+    date a page announces. Each template line is kept on its owner, the first page
+    it was seen on, so a date in a site-wide ticker still yields one item
+    per host instead of one per page.
+
+    Only template lines saved by earlier runs are stripped, so every page
+    of a run is stripped the same way whatever order it was crawled in;
+    lines learned during a run are saved and stripped from the next run
+    on. Lines not seen for max_age_days are forgotten. Candidate counts are per run and capped at
+    max_lines_per_host per host by dropping lines seen only once.
+    """
+
+    def __init__(
+        self,
+        path="site_templates.sqlite",
+        min_pages=3,
+        min_ratio=0.5,
+        max_age_days=30,
+        max_lines_per_host=5000,
+        min_line_words=3,
+        matcher=None,
+        flush_every=500,
+    ):
+        self.path = path
+        self.min_pages = min_pages
+        self.min_ratio = min_ratio
+        self.max_age_days = max_age_days
+        self.max_lines_per_host = max_lines_per_host
+        self.min_line_words = min_line_words
+        self.matcher = matcher
+        self.flush_every = flush_every
+        self.hosts = {}
+        self.pending = set()
+        self.conn = None
+
+    def open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS template_lines (
+                host TEXT NOT NULL,
+                line_hash INTEGER NOT NULL,
+                owner TEXT NOT NULL,
+                last_seen TEXT NOT NULL,
+                PRIMARY KEY (host, line_hash)
+            )
+            """
+        )
+        if self.max_age_days:
+            cutoff = datetime.now(ZoneInfo("Asia/Kolkata")) - timedelta(
+                days=self.max_age_days
+            )
+            self.conn.execute(
+                "DELETE FROM template_lines WHERE last_seen < ?", (cutoff.isoformat(),)
+            )
+        self.conn.commit()
+        for host, line, owner in self.conn.execute(
+            "SELECT host, line_hash, owner FROM template_lines"
+        ):
+            self.get_host(host)["templates"][line] = owner
+
+    def get_host(self, host):
+        state = self.hosts.get(host)
+        if state is None:
+            # templates: saved by earlier runs, stripped; learned: this run
+            state = {"pages": 0, "counts": {}, "templates": {}, "learned": {}}
+            self.hosts[host] = state
+        return state
+
+    def is_candidate(self, line):
+        """Whether line may become a template line."""
+        if len(line.split()) < self.min_line_words:
+            return False
+        return self.matcher is None or not self.matcher.only_matches(line)
+
+    def strip(self, url, text):
+        """
+        Record the lines of a page and return (text without the host's
+        template lines, number of lines removed).
+        """
+        page = url_key(url)
+        host = page.split("/", 1)[0]
+        state = self.get_host(host)
+        state["pages"] += 1
+        templates = state["templates"]
+        learned = state["learned"]
+        counts = state["counts"]
+
+        lines = text.split("\n")
+        # None for lines that are never stripped
+        hashes = [line_hash(line) if self.is_candidate(line) else None for line in lines]
+        kept = [
+            line
+            for line, line_id in zip(lines, hashes)
+            if line_id is None or templates.get(line_id, page) == page
+        ]
+
+        # Count each distinct line once per page
+        for line_id in set(hashes) - {None}:
+            if line_id in templates or line_id in learned:
+                self.pending.add((host, line_id))
+                continue
+            entry = counts.get(line_id)
+            if entry is None:
+                counts[line_id] = [1, page]
+                continue
+            entry[0] += 1
+            if (
+                entry[0] >= self.min_pages
+                and entry[0] >= self.min_ratio * state["pages"]
+            ):
+                learned[line_id] = entry[1]
+                del counts[line_id]
+                self.pending.add((host, line_id))
+
+        if len(counts) > self.max_lines_per_host:
+            state["counts"] = {
+                line_id: entry for line_id, entry in counts.items() if entry[0] > 1
+            }
+        if len(self.pending) >= self.flush_every:
+            self.flush()
+
+        return "\n".join(kept), len(lines) - len(kept)
+
+    def owner(self, host, line_id):
+        state = self.hosts[host]
+        return state["templates"].get(line_id) or state["learned"][line_id]
+
+    def flush(self):
+        if not self.pending or self.conn is None:
+            return
+        now = datetime.now(ZoneInfo("Asia/Kolkata")).isoformat()
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO template_lines VALUES (?, ?, ?, ?)",
+            [
+                (host, line_id, self.owner(host, line_id), now)
+                for host, line_id in self.pending
+            ],
+        )
+        self.conn.commit()
+        self.pending = set()
+
+    def close(self):
+        self.flush()
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+def open_site_templates(settings, matcher=None):
+    """
+    Create and open the site template store configured in settings, or None
+    if disabled. Lines that only hold matches of matcher are never stripped.
+    """
+    if not settings.getbool("SITE_TEMPLATES_ENABLED"):
+        return None
+    templates = SiteTemplates(
+        settings.get("SITE_TEMPLATES_PATH", "site_templates.sqlite"),
+        min_pages=settings.getint("SITE_TEMPLATES_MIN_PAGES", 3),
+        min_ratio=settings.getfloat("SITE_TEMPLATES_MIN_RATIO", 0.5),
+        max_age_days=settings.getfloat("SITE_TEMPLATES_MAX_AGE_DAYS", 30),
+        max_lines_per_host=settings.getint("SITE_TEMPLATES_MAX_LINES_PER_HOST", 5000),
+        min_line_words=settings.getint("SITE_TEMPLATES_MIN_LINE_WORDS", 3),
+        matcher=matcher,
+    )
+    templates.open()
+    return templates
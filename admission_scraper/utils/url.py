@@ -0,0 +1,59 @@
+import hashlib
+from urllib.parse import urlsplit, urlunsplit
+from w3lib.url import canonicalize_url as w3lib_canonicalize_url
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def canonicalize_url(url, default_scheme="https"):
+    """
+    Normalize a URL for storing and fetching.
+
+    Adds default_scheme when the URL has none, lowercases the scheme and
+    host, sorts query arguments, drops the fragment, default ports and an
+    empty query, and removes the trailing slash (as remove_trailing_slash
+    did). The scheme and a leading "www." are kept since sites may only
+    serve one of them; use url_key to compare URLs regardless.
+    """
+    url = str(url).strip()
+    if not url:
+        return url
+    if "://" not in url:
+        url = f"{default_scheme}://{url.lstrip('/')}"
+
+    # Sorts the query, drops the fragment and normalizes percent-encoding
+    parts = urlsplit(w3lib_canonicalize_url(url))
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    netloc = parts.hostname or ""
+    if ":" in netloc:
+        netloc = f"[{netloc}]"  # IPv6 literal
+    if parts.username:
+        credentials = parts.username
+        if parts.password:
+            credentials += f":{parts.password}"
+        netloc = f"{credentials}@{netloc}"
+    if port and port != DEFAULT_PORTS.get(parts.scheme):
+        netloc += f":{port}"
+
+    return urlunsplit((parts.scheme, netloc, parts.path.rstrip("/"), parts.query, ""))
+
+
+def url_key(url):
+    """
+    Key under which URL variants count as the same page: the canonical URL
+    without its scheme and without a leading "www." on the host.
+    """
+    parts = urlsplit(canonicalize_url(url))
+    netloc = parts.netloc.rsplit("@", 1)[-1]
+    if netloc.startswith("www."):
+        netloc = netloc[4:]
+    return urlunsplit(("", netloc, parts.path, parts.query, "")).lstrip("/")
+
+
+def url_fingerprint(url):
+    """64-bit fingerprint of url_key(url)."""
+    digest = hashlib.blake2b(url_key(url).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
@@ -0,0 +1,152 @@
+"""
+Measure how extract_context scales with document size and date clusters.
+
+Generates synthetic notice-board text (~1 date cluster per 2.5 KB, with
+some notices repeated with small edits) at increasing sizes and times the
+context-building stage with the shared token index against the previous
+per-cluster re-tokenization, and the whole extract_context call with each
+similarity index against the previous pairwise dedup:
+
+    python -m benchmarks.extract_context
+    python -m benchmarks.extract_context --max-mb 2 --skip-legacy
+"""
+
+import argparse
+import random
+import re
+import time
+from admission_scraper.spiders.pages import date_pattern
+from admission_scraper.utils.page import (
+    build_cluster_contexts,
+    build_token_index,
+    cluster_matches,
+    extract_context,
+    similarity,
+)
+
+FILLER = (
+    "University campus library hostel faculty department research seminar "
+    "students examination results syllabus calendar committee circular"
+).split()
+
+
+def generate_vocabulary(rng, size=3000):
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    words = FILLER + [
+        "".join(rng.choice(letters) for _ in range(rng.randint(3, 10)))
+        for _ in range(size)
+    ]
+    # Zipf-like weights so a few words are very common, like real text
+    return words, [1 / (rank + 1) for rank in range(len(words))]
+
+
+def generate_text(size, seed=0, repeat_rate=0.3):
+    rng = random.Random(seed)
+    words, weights = generate_vocabulary(rng)
+    parts = []
+    notices = []
+    length = 0
+    while length < size:
+        if notices and rng.random() < 0.04 * repeat_rate:
+            # Repeat an earlier notice block with a few words changed
+            block = rng.choice(notices).split(" ")
+            for _ in range(rng.randint(0, 10)):
+                block[rng.randrange(len(block))] = rng.choices(words, weights)[0]
+            line = " ".join(block)
+        else:
+            line = " ".join(rng.choices(words, weights, k=rng.randint(5, 15)))
+            if rng.random() < 0.04:
+                line += f" admission notice dated {rng.randint(1, 28)}/{rng.randint(1, 12)}/2024"
+                line += " " + " ".join(rng.choices(words, weights, k=80))
+                notices.append(line)
+        parts.append(line)
+        length += len(line) + 1
+    return "\n".join(parts)
+
+
+def legacy_cluster_contexts(text, clusters, before=50, after=50):
+    """The previous implementation: re-tokenize and scan all tokens per cluster."""
+    results = []
+    for cluster in clusters:
+        tokens = text.split()
+        token_positions = []
+        char_count = 0
+        for token in tokens:
+            token_positions.append(char_count)
+            char_count += len(token) + 1
+        token_start = token_end = 0
+        for i, pos in enumerate(token_positions):
+            if pos <= cluster[0].start():
+                token_start = i
+            if pos <= cluster[-1].end():
+                token_end = i
+        extract_start = max(0, token_start - before)
+        extract_end = min(len(tokens), token_end + after)
+        results.append(" ".join(tokens[extract_start:extract_end]))
+    return results
+
+
+def legacy_dedup(cluster_results, similarity_threshold=0.7):
+    """The previous dedup: compare each context with every kept one."""
+    kept = []
+    for result in cluster_results:
+        for existing in kept:
+            if similarity(result["context"], existing["context"]) > similarity_threshold:
+                if len(result["context"]) > len(existing["context"]):
+                    existing["context"] = result["context"]
+                break
+        else:
+            kept.append(dict(result))
+    return kept
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--max-mb", type=float, default=1.0)
+    parser.add_argument("--skip-legacy", action="store_true")
+    args = parser.parse_args()
+
+    size = 64 * 1024
+    print(
+        f"{'size':>8} {'clusters':>9} {'indexed':>9} {'legacy':>9}"
+        f" {'exact':>9} {'minhash':>9} {'legacy dedup':>13} {'kept':>11}"
+    )
+    while size <= args.max_mb * 1024 * 1024:
+        text = generate_text(size)
+        matches = list(re.finditer(date_pattern, text))
+        clusters = cluster_matches(matches, 500)
+
+        def indexed():
+            return build_cluster_contexts(clusters, build_token_index(text), 50, 50)
+
+        cluster_results, indexed_time = timed(indexed)
+        legacy_time = legacy_dedup_time = None
+        if not args.skip_legacy:
+            _, legacy_time = timed(legacy_cluster_contexts, text, clusters)
+            _, legacy_dedup_time = timed(legacy_dedup, cluster_results)
+        exact, exact_time = timed(extract_context, text, date_pattern)
+        minhash, minhash_time = timed(
+            extract_context, text, date_pattern, similarity_index="minhash"
+        )
+
+        legacy = f"{legacy_time:8.3f}s" if legacy_time is not None else f"{'-':>9}"
+        legacy_dedup_column = (
+            f"{legacy_dedup_time:12.3f}s"
+            if legacy_dedup_time is not None
+            else f"{'-':>13}"
+        )
+        kept = f"{len(exact)}/{len(minhash)}"
+        print(
+            f"{size // 1024:>6}KB {len(clusters):>9} {indexed_time:8.3f}s {legacy}"
+            f" {exact_time:8.3f}s {minhash_time:8.3f}s {legacy_dedup_column} {kept:>11}"
+        )
+        size *= 2
+
+if __name__ == "__main__":
+    main()
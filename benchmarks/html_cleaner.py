@@ -0,0 +1,91 @@
+"""
+Compare the bs4 and lxml HTML cleaners on saved pages.
+
+Pages come from the response archive (see RESPONSE_ARCHIVE_DIR) or from a
+directory of .html files:
+
+    python -m benchmarks.html_cleaner
+    python -m benchmarks.html_cleaner --dir saved_pages/ --limit 200
+"""
+
+import argparse
+import glob
+import os
+import time
+from parsel import Selector
+from admission_scraper.utils.page import clean_body_content, clean_body_element
+from admission_scraper.utils.response_store import ResponseStore
+
+
+def load_archived_pages(archive_dir, limit):
+    store = ResponseStore(archive_dir)
+    store.open()
+    try:
+        for entry in store.iter_latest():
+            if entry["meta"].get("is_pdf"):
+                continue
+            body = store.read_body(entry["body_hash"])
+            yield entry["response_url"], body.decode("utf-8", "ignore")
+            limit -= 1
+            if limit == 0:
+                return
+    finally:
+        store.close()
+
+
+def load_html_files(directory, limit):
+    paths = sorted(glob.glob(os.path.join(directory, "*.html")))
+    for path in paths[:limit] if limit else paths:
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            yield path, f.read()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--archive", default="response_archive")
+    parser.add_argument("--dir", help="directory of .html files instead of the archive")
+    parser.add_argument("--limit", type=int, default=0)
+    args = parser.parse_args()
+
+    pages = (
+        load_html_files(args.dir, args.limit)
+        if args.dir
+        else load_archived_pages(args.archive, args.limit)
+    )
+
+    bs4_time = lxml_time = 0.0
+    total = mismatched = total_bytes = 0
+    for name, html in pages:
+        selector = Selector(text=html)
+        body = selector.css("body")
+        if not body:
+            continue
+        total += 1
+        total_bytes += len(html)
+
+        # The bs4 path includes serializing the body, as PagesSpider did
+        start = time.perf_counter()
+        bs4_text = clean_body_content(body.get())
+        bs4_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        lxml_text = clean_body_element(body[0].root)
+        lxml_time += time.perf_counter() - start
+
+        if bs4_text != lxml_text:
+            mismatched += 1
+            print(f"Output differs: {name}")
+
+    if not total:
+        print("No pages found")
+        return
+
+    print(f"Pages: {total} ({total_bytes / 1024 / 1024:.1f} MB)")
+    print(f"bs4:  {bs4_time:.2f}s ({total / bs4_time:.1f} pages/s)")
+    print(f"lxml: {lxml_time:.2f}s ({total / lxml_time:.1f} pages/s)")
+    print(f"Speedup: {bs4_time / lxml_time:.1f}x")
+    print(f"Identical output: {total - mismatched} of {total}")
+
+
+if __name__ == "__main__":
+    main()
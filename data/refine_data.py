@@ -1,22 +1,16 @@
+# Run from the repository root: python -m data.refine_data
 import pandas as pd
+from admission_scraper.utils.url import canonicalize_url, url_key
 
 df = pd.read_csv("data\\iits.csv")
-df["url"] = df["url"].apply(
-    lambda x: (
-        "https://" + str(x).strip()
-        if not (str(x).startswith("https://") or str(x).startswith("http://"))
-        else str(x).strip()
-    )
-)
-df["url"] = df["url"].apply(lambda x: x.rstrip("/"))  # Remove trailing slashes
-df["url"] = df["url"].apply(lambda x: x.rstrip("#"))  # Remove trailing hashes
-df["url"] = df["url"].apply(lambda x: x.rstrip("?"))  # Remove trailing question marks
-df["url"] = df["url"].apply(lambda x: x.rstrip("&"))  # Remove trailing ampersands
+# Adds https:// when missing, lowercases the host and strips trailing
+# slashes, fragments and empty queries
+df["url"] = df["url"].apply(canonicalize_url)
 df["state"] = df[
     "state"
 ].str.strip()  # Remove leading and trailing spaces from state names
-# Remove duplicate URLs
-df = df.drop_duplicates(subset=["url"], keep="first")
+# Remove duplicate URLs, including http/https and www/non-www variants
+df = df[~df["url"].map(url_key).duplicated(keep="first")]
 df.to_csv("data\\iits.csv", index=False)
 
 print("URLs updated.")
@@ -1,10 +1,27 @@
 from sqlalchemy.orm import Session
+from admission_scraper.utils.url import canonicalize_url, url_key
 from db.models import Institute, Program, Tag, ScrapedPage
 
 
 def get_institute_from_website(db: Session, website: str):
     try:
-        return db.query(Institute).filter(Institute.website == website).first()
+        website = canonicalize_url(website)
+        institute = db.query(Institute).filter(Institute.website == website).first()
+        if institute is not None:
+            return institute
+
+        # Stored websites may differ in scheme, "www." or trailing slash
+        key = url_key(website)
+        host = key.split("/", 1)[0]
+        candidates = db.query(Institute).filter(Institute.website.contains(host))
+        return next(
+            (
+                candidate
+                for candidate in candidates
+                if url_key(candidate.website) == key
+            ),
+            None,
+        )
     except Exception as e:
         print(f"Error fetching institute for website {website}: {e}")
         return None
@@ -40,3 +57,21 @@ def get_all_scraped_pages(db: Session):
     except Exception as e:
         print(f"Error fetching all scraped pages: {e}")
         return None
+
+
+def get_scraped_page_hashes(db: Session, batch_size: int = 1000):
+    """
+    Map of url -> (content_hash, last_scraped) for every scraped page,
+    fetched in one query streamed in batches of batch_size rows.
+    """
+    try:
+        rows = db.query(
+            ScrapedPage.url, ScrapedPage.content_hash, ScrapedPage.last_scraped
+        ).yield_per(batch_size)
+        return {
+            url: (content_hash, last_scraped)
+            for url, content_hash, last_scraped in rows
+        }
+    except Exception as e:
+        print(f"Error fetching scraped page hashes: {e}")
+        return None
@@ -5,6 +5,7 @@ import pandas as pd
 from sqlalchemy.exc import SQLAlchemyError, IntegrityError
 import logging
 from db.utils import split_content, normalize_state_name, get_all_states
+from admission_scraper.utils.url import canonicalize_url, url_key
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -33,6 +34,8 @@ def seed_institutes(db: Session):
     if dataframes:
         df = pd.concat(dataframes, ignore_index=True)
         logger.info(f"Total records loaded: {len(df)}")
+        # The same site may be listed with different scheme/www variants
+        df = df[~df["url"].map(url_key).duplicated(keep="first")]
     else:
         logger.error("No data loaded from CSV files")
         df = pd.DataFrame()  # Empty DataFrame as fallback
@@ -102,7 +105,7 @@ def seed_institutes(db: Session):
             for site in batch:
                 website = Institute(
                     name=site["uni_name"],
-                    website=site["url"],
+                    website=canonicalize_url(site["url"]),
                     state_id=site["state_id"],
                 )
                 sites.append(website)
@@ -0,0 +1,352 @@
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import time
+import uuid
+import httpx
+from llm.gemini import (
+    MODEL,
+    batch_request,
+    cache_result,
+    cached_result,
+    client,
+    parse_batch_response,
+)
+from llm.process import process_page
+
+logger = logging.getLogger(__name__)
+
+# Job states of the Gemini batch API
+BATCH_STATE_PENDING = "BATCH_STATE_PENDING"
+BATCH_STATE_RUNNING = "BATCH_STATE_RUNNING"
+BATCH_STATE_SUCCEEDED = "BATCH_STATE_SUCCEEDED"
+BATCH_STATE_FAILED = "BATCH_STATE_FAILED"
+BATCH_STATE_CANCELLED = "BATCH_STATE_CANCELLED"
+BATCH_STATE_EXPIRED = "BATCH_STATE_EXPIRED"
+FINISHED_STATES = {
+    BATCH_STATE_SUCCEEDED,
+    BATCH_STATE_FAILED,
+    BATCH_STATE_CANCELLED,
+    BATCH_STATE_EXPIRED,
+}
+
+
+class GeminiBatchBackend:
+    """
+    Gemini Developer API batch mode: the requests are uploaded as a JSON
+    lines file and a batch job is created for it with the REST endpoint
+    (the pinned google-genai only supports Vertex AI batch jobs).
+    """
+
+    base_url = "https://generativelanguage.googleapis.com/v1beta"
+
+    def __init__(self, api_key=None, model=MODEL, timeout=60):
+        self.model = model
+        self.http = httpx.Client(
+            headers={"x-goog-api-key": api_key or os.environ.get("GEMINI_API_KEY", "")},
+            timeout=timeout,
+        )
+
+    def submit(self, requests, display_name):
+        """Start a job for (key, request) pairs, returning the job name."""
+        with tempfile.NamedTemporaryFile(
+            "w", suffix=".jsonl", delete=False, encoding="utf-8"
+        ) as f:
+            for key, request in requests:
+                f.write(json.dumps({"key": key, "request": request}, ensure_ascii=False) + "\n")
+        try:
+            uploaded = client.files.upload(
+                file=f.name,
+                config={"mime_type": "application/jsonl", "display_name": display_name},
+            )
+        finally:
+            os.remove(f.name)
+
+        response = self.http.post(
+            f"{self.base_url}/models/{self.model}:batchGenerateContent",
+            json={
+                "batch": {
+                    "display_name": display_name,
+                    "input_config": {"file_name": uploaded.name},
+                }
+            },
+        )
+        response.raise_for_status()
+        return response.json()["name"]
+
+    def get(self, name):
+        response = self.http.get(f"{self.base_url}/{name}")
+        response.raise_for_status()
+        return response.json()
+
+    def state(self, name):
+        return self.get(name).get("metadata", {}).get("state", BATCH_STATE_PENDING)
+
+    def results(self, name):
+        """Yield (key, output line) of a finished job."""
+        responses_file = self.get(name).get("response", {}).get("responsesFile")
+        if not responses_file:
+            return
+        data = client.files.download(file=responses_file)
+        for line in data.decode("utf-8").splitlines():
+            if line.strip():
+                output = json.loads(line)
+                yield output.get("key"), output
+
+
+def empty_response(request):
+    """Default LocalBatchBackend responder: no announcements for any chunk."""
+    text = json.dumps({"announcements": []})
+    return {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}}]}
+
+
+class LocalBatchBackend:
+    """
+    Local stand-in for the Gemini batch API with the same job lifecycle,
+    for testing the submit/collect flow without network or cost. Jobs are
+    JSON lines files in directory; a job runs when it is first polled,
+    answering each request with responder(request), which returns a
+    GenerateContentResponse dict.
+    """
+
+    def __init__(self, directory="llm_batch_local", responder=empty_response):
+        self.directory = directory
+        self.responder = responder
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, name, kind):
+        return os.path.join(self.directory, f"{name.replace('/', '-')}.{kind}.jsonl")
+
+    def submit(self, requests, display_name):
+        name = f"batches/local-{uuid.uuid4().hex[:12]}"
+        with open(self.path(name, "input"), "w", encoding="utf-8") as f:
+            for key, request in requests:
+                f.write(json.dumps({"key": key, "request": request}, ensure_ascii=False) + "\n")
+        return name
+
+    def state(self, name):
+        output_path = self.path(name, "output")
+        if os.path.exists(output_path):
+            return BATCH_STATE_SUCCEEDED
+        if not os.path.exists(self.path(name, "input")):
+            return BATCH_STATE_EXPIRED
+        with open(self.path(name, "input"), encoding="utf-8") as f, open(
+            f"{output_path}.tmp", "w", encoding="utf-8"
+        ) as out:
+            for line in f:
+                line = json.loads(line)
+                try:
+                    output = {"key": line["key"], "response": self.responder(line["request"])}
+                except Exception as e:
+                    output = {"key": line["key"], "error": {"message": str(e)}}
+                out.write(json.dumps(output, ensure_ascii=False) + "\n")
+        os.replace(f"{output_path}.tmp", output_path)
+        return BATCH_STATE_RUNNING
+
+    def results(self, name):
+        with open(self.path(name, "output"), encoding="utf-8") as f:
+            for line in f:
+                output = json.loads(line)
+                yield output["key"], output
+
+
+class BatchJobTracker:
+    """
+    Local record of submitted batch jobs (SQLite): their last known state
+    and the pages (url, site, items) each job holds requests for, so the
+    results can be stored once the job finishes, even from another run.
+    """
+
+    def __init__(self, path="llm_batch_jobs.sqlite"):
+        self.path = path
+        self.conn = None
+
+    def open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                name TEXT PRIMARY KEY,
+                state TEXT NOT NULL,
+                requests INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                ingested INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS job_pages (
+                job_name TEXT NOT NULL,
+                page INTEGER NOT NULL,
+                url TEXT NOT NULL,
+                site TEXT,
+                items TEXT NOT NULL,
+                cached TEXT NOT NULL,
+                PRIMARY KEY (job_name, page)
+            );
+            """
+        )
+        self.conn.commit()
+
+    def add_job(self, name, requests, pages):
+        """pages: (url, site, items, cached results) of the job, in key order."""
+        now = time.time()
+        self.conn.execute(
+            "INSERT INTO jobs (name, state, requests, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+            (name, BATCH_STATE_PENDING, requests, now, now),
+        )
+        self.conn.executemany(
+            "INSERT INTO job_pages VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (name, page, url, site, json.dumps(items), json.dumps(cached))
+                for page, (url, site, items, cached) in enumerate(pages)
+            ],
+        )
+        self.conn.commit()
+
+    def set_state(self, name, state, ingested=False):
+        self.conn.execute(
+            "UPDATE jobs SET state = ?, updated_at = ?, ingested = ? WHERE name = ?",
+            (state, time.time(), int(ingested), name),
+        )
+        self.conn.commit()
+
+    def open_jobs(self):
+        """Names of jobs whose results have not been stored yet."""
+        return [
+            name
+            for (name,) in self.conn.execute(
+                "SELECT name FROM jobs WHERE ingested = 0 AND state NOT IN (?, ?, ?) ORDER BY created_at",
+                (BATCH_STATE_FAILED, BATCH_STATE_CANCELLED, BATCH_STATE_EXPIRED),
+            )
+        ]
+
+    def pending_urls(self):
+        """URLs in jobs that are still open, which must not be submitted again."""
+        open_jobs = self.open_jobs()
+        if not open_jobs:
+            return set()
+        return {
+            url
+            for (url,) in self.conn.execute(
+                f"SELECT url FROM job_pages WHERE job_name IN ({','.join('?' * len(open_jobs))})",
+                open_jobs,
+            )
+        }
+
+    def job_pages(self, name):
+        for page, url, site, items, cached in self.conn.execute(
+            "SELECT page, url, site, items, cached FROM job_pages WHERE job_name = ? ORDER BY page",
+            (name,),
+        ):
+            yield page, url, site, json.loads(items), json.loads(cached)
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+def request_key(page, item):
+    return f"{page}-{item}"
+
+
+def submit_batch_jobs(pages, backend, tracker, max_requests=10000):
+    """
+    Serialize the items of pages ((url, site, items) of new and changed
+    pages) as batch requests, starting a job every max_requests requests.
+    Items with a cached result are not sent; pages already in an open job
+    are skipped. Returns the names of the started jobs.
+    """
+    skip_urls = tracker.pending_urls()
+    jobs = []
+    job_pages = []
+    requests = []
+
+    def start_job():
+        name = backend.submit(requests, f"admission-scraper-{int(time.time())}-{len(jobs)}")
+        tracker.add_job(name, len(requests), job_pages)
+        print(f"Submitted batch job {name} with {len(requests)} requests")
+        jobs.append(name)
+
+    for url, site, items in pages:
+        if url in skip_urls:
+            print(f"Skipping {url}, already in an open batch job")
+            continue
+        cached = [cached_result(item["context"], url) for item in items]
+        if all(result is not None for result in cached):
+            process_page(url, site, items, extracted_results=cached)
+            continue
+
+        page = len(job_pages)
+        job_pages.append((url, site, items, cached))
+        for i, item in enumerate(items):
+            if cached[i] is None:
+                requests.append((request_key(page, i), batch_request(item["context"], url)))
+        if len(requests) >= max_requests:
+            start_job()
+            job_pages = []
+            requests = []
+    if requests:
+        start_job()
+    return jobs
+
+
+def collect_batch_jobs(backend, tracker, stored=None):
+    """
+    Poll the open jobs and store the results of finished ones through
+    process_page, like an interactive run. Items whose request failed are
+    extracted interactively. The URLs of stored pages are added to the
+    stored set when given. Returns the number of jobs still running.
+    """
+    running = 0
+    for name in tracker.open_jobs():
+        state = backend.state(name)
+        if state not in FINISHED_STATES:
+            tracker.set_state(name, state)
+            print(f"Batch job {name}: {state}")
+            running += 1
+            continue
+        if state != BATCH_STATE_SUCCEEDED:
+            # Its pages were not marked as scraped, so the next run submits them again
+            tracker.set_state(name, state)
+            print(f"Batch job {name} ended with {state}")
+            continue
+
+        results = {}
+        for key, output in backend.results(name):
+            if "response" not in output:
+                logger.warning(f"Batch request {key} of {name} failed: {output.get('error')}")
+                continue
+            try:
+                results[key] = parse_batch_response(output["response"])
+            except (KeyError, IndexError, ValueError) as e:
+                logger.warning(f"Invalid batch response {key} of {name}: {e}")
+
+        pages = 0
+        for page, url, site, items, cached in tracker.job_pages(name):
+            extracted = []
+            for i, item in enumerate(items):
+                result = cached[i]
+                if result is None:
+                    result = results.get(request_key(page, i))
+                    if result is not None:
+                        cache_result(item["context"], url, result)
+                extracted.append(result)
+            if process_page(url, site, items, extracted_results=extracted) and stored is not None:
+                stored.add(url)
+            pages += 1
+        tracker.set_state(name, state, ingested=True)
+        print(f"Stored results of batch job {name} for {pages} pages")
+    return running
+
+
+def make_batch_backend(kind, local_dir="llm_batch_local"):
+    if kind == "gemini":
+        return GeminiBatchBackend()
+    if kind == "local":
+        return LocalBatchBackend(local_dir)
+    raise ValueError(f"Invalid batch job backend {kind!r}, expected 'gemini' or 'local'")
@@ -0,0 +1,133 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+def config_hash(model, system_prompt, schema):
+    """Hash of the request configuration shared by every text chunk."""
+    payload = json.dumps([model, system_prompt, schema], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def response_key(config, url, content):
+    """Hash of everything that determines an extraction result (config from config_hash())."""
+    payload = json.dumps([config, url, content], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Persistent cache of parsed LLM results in SQLite, so contexts that were
+    already extracted (unchanged items of a changed page, pages of a run
+    that crashed) are not sent again.
+
+    Entries older than ttl_days are misses and deleted. When the stored
+    results exceed max_size_mb, the least recently used entries are
+    evicted. Safe to share between extraction threads.
+    """
+
+    def __init__(self, path="llm_cache.sqlite", ttl_days=30, max_size_mb=200, evict_every=500):
+        self.path = path
+        self.ttl_days = ttl_days
+        self.max_size_mb = max_size_mb
+        self.evict_every = evict_every
+        self.writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.conn = None
+
+    def open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                result TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+            """
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)"
+        )
+        self.conn.commit()
+        self.evict()
+
+    def expired_before(self):
+        if not self.ttl_days:
+            return 0
+        return time.time() - self.ttl_days * 86400
+
+    def get(self, key):
+        """The cached result for key, or None."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT result, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or row[1] < self.expired_before():
+                self.misses += 1
+                return None
+            self.conn.execute(
+                "UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key)
+            )
+            self.conn.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key, result):
+        data = json.dumps(result, ensure_ascii=False)
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                (key, data, len(data), now, now),
+            )
+            self.conn.commit()
+            self.writes += 1
+            evict = self.writes % self.evict_every == 0
+        if evict:
+            self.evict()
+
+    def evict(self):
+        """Delete expired entries, then the least recently used ones over max_size_mb."""
+        with self.lock:
+            self.conn.execute(
+                "DELETE FROM responses WHERE created_at < ?", (self.expired_before(),)
+            )
+            if self.max_size_mb:
+                max_size = self.max_size_mb * 1024 * 1024
+                total = self.conn.execute(
+                    "SELECT COALESCE(SUM(size), 0) FROM responses"
+                ).fetchone()[0]
+                if total > max_size:
+                    # Keep the most recently used entries that fit in max_size
+                    self.conn.execute(
+                        """
+                        DELETE FROM responses WHERE key IN (
+                            SELECT key FROM (
+                                SELECT key, SUM(size) OVER (
+                                    ORDER BY last_used DESC, key
+                                ) AS kept
+                                FROM responses
+                            ) WHERE kept > ?
+                        )
+                        """,
+                        (max_size,),
+                    )
+            self.conn.commit()
+
+    def close(self):
+        if self.conn is not None:
+            self.evict()
+            self.conn.close()
+            self.conn = None
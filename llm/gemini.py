@@ -1,17 +1,34 @@
 from google import genai
+from google.genai import types
 from dotenv import load_dotenv
 import os
 import json
+import threading
+import time
 from db.data import get_all_programs, get_all_tags
 from db.session import get_db
+from llm.cache import config_hash, response_key
+from llm.rate_limit import RateLimiter, estimate_tokens
 
 load_dotenv()
 
+MODEL = "gemini-2.0-flash"
+
 db = next(get_db())
 client = genai.Client(api_key=os.environ.get("GEMINI_API_KEY"))
 base_prompt = ""
 programs = get_all_programs(db)
 tags = get_all_tags(db)
+# Shared by all extraction workers, see configure_rate_limit(),
+# configure_response_cache() and configure_context_cache()
+rate_limiter = None
+response_cache = None
+context_cache_ttl = 0
+context_cache = None
+context_cache_lock = threading.Lock()
+# Schemas built from programs and tags, rebuilt when they change (see
+# set_reference_data())
+schemas = {}
 
 try:
     with open("base_prompt.txt", "r") as file:
@@ -25,6 +42,241 @@ except FileNotFoundError:
     pass
 
 
+def configure_rate_limit(requests_per_minute, tokens_per_minute):
+    """Limit Gemini calls from all threads to these per-minute quotas (0 = unlimited)."""
+    global rate_limiter
+    rate_limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+
+
+def configure_response_cache(cache):
+    """Reuse results from cache (an open llm.cache.ResponseCache), or stop caching with None."""
+    global response_cache
+    response_cache = cache
+
+
+def set_reference_data(new_programs, new_tags):
+    """Use these programs and tags in the schema enums, rebuilding the schemas if their names changed."""
+    global programs, tags
+
+    def names(items):
+        return [item.name for item in items or []]
+
+    changed = names(programs) != names(new_programs) or names(tags) != names(new_tags)
+    programs = new_programs
+    tags = new_tags
+    if changed:
+        schemas.clear()
+
+
+def configure_context_cache(ttl_seconds):
+    """
+    Keep the system prompt in a Gemini cached context, created on the first
+    request and kept alive in steps of ttl_seconds, so requests only carry
+    the text chunk (0 disables). See release_context_cache().
+    """
+    global context_cache_ttl
+    context_cache_ttl = ttl_seconds
+
+
+def cached_context_name():
+    """Name of the cached context holding the system prompt, or None to send it with the request."""
+    global context_cache, context_cache_ttl
+    if not context_cache_ttl or not base_prompt:
+        return None
+    with context_cache_lock:
+        now = time.monotonic()
+        try:
+            if context_cache is None:
+                cached = client.caches.create(
+                    model=MODEL,
+                    config={
+                        "system_instruction": base_prompt,
+                        "display_name": "admission-scraper-system-prompt",
+                        "ttl": f"{context_cache_ttl}s",
+                    },
+                )
+                context_cache = {"name": cached.name, "expires": now + context_cache_ttl}
+            elif now > context_cache["expires"] - 60:
+                client.caches.update(
+                    name=context_cache["name"], config={"ttl": f"{context_cache_ttl}s"}
+                )
+                context_cache["expires"] = now + context_cache_ttl
+        except Exception as e:
+            # E.g. the prompt is below the model's minimum size for caching
+            print(f"Context caching unavailable, sending the system prompt with each request: {e}")
+            context_cache = None
+            context_cache_ttl = 0
+            return None
+        return context_cache["name"]
+
+
+def release_context_cache():
+    """Delete the cached context, so its storage is not billed until it expires."""
+    global context_cache
+    with context_cache_lock:
+        if context_cache is None:
+            return
+        try:
+            client.caches.delete(name=context_cache["name"])
+        except Exception as e:
+            print(f"Error deleting cached context {context_cache['name']}: {e}")
+        context_cache = None
+
+
+def request_config(schema):
+    config = {"response_mime_type": "application/json", "response_schema": schema}
+    cached_content = cached_context_name()
+    if cached_content:
+        config["cached_content"] = cached_content
+    else:
+        config["system_instruction"] = base_prompt
+    return config
+
+
+def cached_schema(name, build):
+    schema = schemas.get(name)
+    if schema is None:
+        schema = build()
+        schemas[name] = schema
+    return schema
+
+
+def build_announcements_schema():
+    """Schema of the announcements extracted from one text chunk."""
+    return {
+        "type": "array",
+        "items": {
+            "type": "object",
+            "required": ["title", "content", "announcement_type"],
+            "properties": {
+                "title": {
+                    "type": "string",
+                    "description": "Title of the announcement",
+                },
+                "content": {
+                    "type": "string",
+                    "description": "Main text content of the announcement",
+                },
+                "published_date": {
+                    "type": "string",
+                    "format": "date-time",
+                    "description": "Date when the announcement was published (YYYY-MM-DD)",
+                    "nullable": True,
+                },
+                "application_open_date": {
+                    "type": "string",
+                    "format": "date-time",
+                    "description": "Date when applications open (YYYY-MM-DD)",
+                    "nullable": True,
+                },
+                "application_deadline": {
+                    "type": "string",
+                    "format": "date-time",
+                    "description": "Application deadline date (YYYY-MM-DD)",
+                    "nullable": True,
+                },
+                "term": {
+                    "type": "string",
+                    "description": "Academic term referenced (e.g., 'Fall 2025')",
+                    "nullable": True,
+                },
+                "contact_info": {
+                    "type": "string",
+                    "description": "Contact information provided in the announcement",
+                    "nullable": True,
+                },
+                "announcement_type": {
+                    "type": "string",
+                    "enum": [
+                        "admission_dates",
+                        "contact_info",
+                        "exam_info",
+                        "result_info",
+                        "general",
+                    ],
+                    "description": "Type of announcement",
+                },
+                "programs_courses": {
+                    "type": "array",
+                    "items": {
+                        "type": "string",
+                        "enum": list(map(lambda x: x.name, programs)),
+                        "description": "Names of programs or courses related to the announcement",
+                    },
+                },
+                "tags": {
+                    "type": "array",
+                    "items": {
+                        "type": "string",
+                        "enum": list(map(lambda x: x.name, tags)),
+                        "description": "Tags related to the announcement",
+                    },
+                    "description": "List of tags associated with the announcement",
+                },
+            },
+        },
+    }
+
+
+def announcements_schema():
+    return cached_schema("announcements", build_announcements_schema)
+
+
+def response_schema():
+    return cached_schema(
+        "response",
+        lambda: {"type": "object", "properties": {"announcements": announcements_schema()}},
+    )
+
+
+def batch_response_schema(count):
+    """One announcements list per text chunk, under item_0 ... item_<count - 1>."""
+
+    def build():
+        properties = {f"item_{i}": announcements_schema() for i in range(count)}
+        return {
+            "type": "object",
+            "properties": properties,
+            "required": list(properties),
+            "propertyOrdering": list(properties),
+        }
+
+    return cached_schema(("batch", count), build)
+
+
+def response_config_hash():
+    """Hash of the model, system prompt and response schema, part of every cache key."""
+    return cached_schema(
+        "config_hash", lambda: config_hash(MODEL, base_prompt, response_schema())
+    )
+
+
+def batch_config_hash():
+    """
+    Like response_config_hash(), for results of batched requests, which use
+    another prompt and schema and so are cached apart from single ones.
+    """
+    return cached_schema(
+        "batch_config_hash",
+        lambda: config_hash(MODEL, base_prompt, {"batch": announcements_schema()}),
+    )
+
+
+def normalize_result(result_json):
+    if "announcements" in result_json:
+        for announcement in result_json["announcements"]:
+            if (
+                announcement.get("announcement_type") == "admission_dates"
+                and announcement.get("application_deadline") is None
+            ):
+                announcement["announcement_type"] = "general"
+    return result_json
+
+
+def chunk_prompt(content, url):
+    return f"Text Chunk:\n{content}\nSource URL: {url}"
+
+
 def extract_with_gemini(content, url):
     """
     Extracts announcements from the given content and URL using Gemini API.
@@ -36,102 +288,121 @@ def extract_with_gemini(content, url):
     Returns:
         dict: The extracted announcements in JSON format.
     """
-    prompt = f"Text Chunk:\n{content}\nSource URL: {url}"
+    prompt = chunk_prompt(content, url)
+    schema = response_schema()
+
+    key = None
+    if response_cache is not None:
+        key = response_key(response_config_hash(), url, content)
+        cached = response_cache.get(key)
+        if cached is not None:
+            return cached
 
+    if rate_limiter is not None:
+        rate_limiter.acquire(estimate_tokens(base_prompt) + estimate_tokens(prompt))
     response = client.models.generate_content(
-        model="gemini-2.0-flash",
+        model=MODEL,
         contents=prompt,
-        config={
-            "system_instruction": base_prompt,
-            "response_mime_type": "application/json",
-            "response_schema": {
-                "type": "object",
-                "properties": {
-                    "announcements": {
-                        "type": "array",
-                        "items": {
-                            "type": "object",
-                            "required": ["title", "content", "announcement_type"],
-                            "properties": {
-                                "title": {
-                                    "type": "string",
-                                    "description": "Title of the announcement",
-                                },
-                                "content": {
-                                    "type": "string",
-                                    "description": "Main text content of the announcement",
-                                },
-                                "published_date": {
-                                    "type": "string",
-                                    "format": "date-time",
-                                    "description": "Date when the announcement was published (YYYY-MM-DD)",
-                                    "nullable": True,
-                                },
-                                "application_open_date": {
-                                    "type": "string",
-                                    "format": "date-time",
-                                    "description": "Date when applications open (YYYY-MM-DD)",
-                                    "nullable": True,
-                                },
-                                "application_deadline": {
-                                    "type": "string",
-                                    "format": "date-time",
-                                    "description": "Application deadline date (YYYY-MM-DD)",
-                                    "nullable": True,
-                                },
-                                "term": {
-                                    "type": "string",
-                                    "description": "Academic term referenced (e.g., 'Fall 2025')",
-                                    "nullable": True,
-                                },
-                                "contact_info": {
-                                    "type": "string",
-                                    "description": "Contact information provided in the announcement",
-                                    "nullable": True,
-                                },
-                                "announcement_type": {
-                                    "type": "string",
-                                    "enum": [
-                                        "admission_dates",
-                                        "contact_info",
-                                        "exam_info",
-                                        "result_info",
-                                        "general",
-                                    ],
-                                    "description": "Type of announcement",
-                                },
-                                "programs_courses": {
-                                    "type": "array",
-                                    "items": {
-                                        "type": "string",
-                                        "enum": list(map(lambda x: x.name, programs)),
-                                        "description": "Names of programs or courses related to the announcement",
-                                    },
-                                },
-                                "tags": {
-                                    "type": "array",
-                                    "items": {
-                                        "type": "string",
-                                        "enum": list(map(lambda x: x.name, tags)),
-                                        "description": "Tags related to the announcement",
-                                    },
-                                    "description": "List of tags associated with the announcement",
-                                },
-                            },
-                        },
-                    }
-                },
-            },
-        },
+        config=request_config(schema),
     )
 
     response_text = response.candidates[0].content.parts[0].text
-    result_json = json.loads(response_text)
-    if "announcements" in result_json:
-        for announcement in result_json["announcements"]:
-            if (
-                announcement.get("announcement_type") == "admission_dates"
-                and announcement.get("application_deadline") is None
-            ):
-                announcement["announcement_type"] = "general"
+    result_json = normalize_result(json.loads(response_text))
+    if response_cache is not None:
+        response_cache.set(key, result_json)
     return result_json
+
+
+def extract_batch_with_gemini(contents, url):
+    """
+    Extracts announcements from several text chunks of the same URL in one
+    Gemini request. Results are cached per chunk (apart from results of
+    single requests), and only uncached chunks are sent.
+
+    Args:
+        contents (list[str]): The text chunks to analyze.
+        url (str): The source URL of the chunks.
+
+    Returns:
+        list[dict]: The extracted announcements of each chunk, in order.
+
+    Raises:
+        ValueError: If the response is not valid JSON or misses a chunk.
+    """
+    results = [None] * len(contents)
+    keys = [None] * len(contents)
+    if response_cache is not None:
+        for i, content in enumerate(contents):
+            keys[i] = response_key(batch_config_hash(), url, content)
+            results[i] = response_cache.get(keys[i])
+    missing = [i for i, result in enumerate(results) if result is None]
+    if not missing:
+        return results
+
+    chunks = "\n\n".join(
+        f"[item_{n}]\n{contents[i]}" for n, i in enumerate(missing)
+    )
+    prompt = (
+        f"Text Chunks:\n{chunks}\nSource URL: {url}\n"
+        "Extract the announcements of each text chunk separately and return "
+        "them under the chunk's item key."
+    )
+    if rate_limiter is not None:
+        rate_limiter.acquire(estimate_tokens(base_prompt) + estimate_tokens(prompt))
+    response = client.models.generate_content(
+        model=MODEL,
+        contents=prompt,
+        config=request_config(batch_response_schema(len(missing))),
+    )
+
+    response_text = response.candidates[0].content.parts[0].text
+    result_json = json.loads(response_text)
+    for n, i in enumerate(missing):
+        announcements = result_json.get(f"item_{n}")
+        if not isinstance(announcements, list):
+            raise ValueError(f"Batch response has no announcements for item_{n}")
+        results[i] = normalize_result({"announcements": announcements})
+        if response_cache is not None:
+            response_cache.set(keys[i], results[i])
+    return results
+
+
+def cached_result(content, url):
+    """The cached extraction result of a text chunk, or None."""
+    if response_cache is None:
+        return None
+    return response_cache.get(response_key(response_config_hash(), url, content))
+
+
+def cache_result(content, url, result):
+    if response_cache is not None:
+        response_cache.set(response_key(response_config_hash(), url, content), result)
+
+
+def batch_request(content, url):
+    """
+    The GenerateContentRequest of extract_with_gemini for one text chunk,
+    as a line of a Gemini batch job input file.
+    """
+    schema = cached_schema(
+        "batch_request",
+        lambda: types.Schema.model_validate(response_schema()).model_dump(
+            mode="json", exclude_none=True, by_alias=True
+        ),
+    )
+    # Batch jobs may run after a cached context expired, so the system
+    # prompt is always included
+    return {
+        "contents": [{"role": "user", "parts": [{"text": chunk_prompt(content, url)}]}],
+        "system_instruction": {"parts": [{"text": base_prompt}]},
+        "generation_config": {
+            "response_mime_type": "application/json",
+            "response_schema": schema,
+        },
+    }
+
+
+def parse_batch_response(response):
+    """Parsed result of a GenerateContentResponse dict from a batch job output file."""
+    response_text = response["candidates"][0]["content"]["parts"][0]["text"]
+    return normalize_result(json.loads(response_text))
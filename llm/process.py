@@ -1,4 +1,4 @@
-from llm.gemini import extract_with_gemini
+from llm.gemini import extract_batch_with_gemini, extract_with_gemini, set_reference_data
 from db.session import get_db, SessionLocal
 from db.data import (
     get_institute_from_website,
@@ -7,11 +7,13 @@ from db.data import (
     get_all_scraped_pages,
 )
 from db.models import Announcement, AnnouncementProgram, ScrapedPage, AnnouncementTags
+from llm.rate_limit import backoff_delay, estimate_tokens, retry_after_seconds
 import hashlib
 from datetime import datetime
 from zoneinfo import ZoneInfo
 from sqlalchemy import update
 import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from google.genai.errors import APIError
 from sqlalchemy.exc import OperationalError, IntegrityError
 import logging
@@ -42,6 +44,7 @@ def load_reference_data():
         scraped_urls = (
             [page.url for page in scraped_pages] if scraped_pages is not None else []
         )
+        set_reference_data(db_programs, db_tags)
     except Exception as e:
         logger.error(f"Error loading reference data: {e}")
     finally:
@@ -64,6 +67,14 @@ def get_fresh_db_session():
         return next(get_db())
 
 
+def items_content_hash(items: list[dict[str, str]]):
+    """Hash of the merged contexts of a page's items, as stored in ScrapedPage.content_hash"""
+    merged_content = " ".join(
+        [item["context"] for item in items if item["context"] is not None]
+    )
+    return hashlib.sha256(merged_content.encode()).hexdigest()
+
+
 def content_changed(url, content):
     db = get_fresh_db_session()
     try:
@@ -79,7 +90,69 @@ def content_changed(url, content):
         db.close()
 
 
-def process_page(url: str, site: str, items: list[dict[str, str]]):
+def batch_items(items: list[dict[str, str]], max_tokens: int, max_items: int):
+    """
+    Split items into consecutive batches of at most max_items items whose
+    contexts fit in max_tokens estimated tokens. A context larger than
+    max_tokens gets a batch of its own.
+    """
+    batches = []
+    batch = []
+    batch_tokens = 0
+    for item in items:
+        tokens = estimate_tokens(str(item["context"]))
+        if batch and (batch_tokens + tokens > max_tokens or len(batch) >= max_items):
+            batches.append(batch)
+            batch = []
+            batch_tokens = 0
+        batch.append(item)
+        batch_tokens += tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def extract_item_batch(url: str, items: list[dict[str, str]], retry_limit: int = 3):
+    """
+    Extract a batch of items of one page in a single request. Returns one
+    result per item, or None if the batch failed and the items should be
+    extracted one by one.
+    """
+    for attempt in range(retry_limit):
+        try:
+            return extract_batch_with_gemini([item["context"] for item in items], url)
+        except APIError as e:
+            if e.code != 429:
+                logger.error(f"API error for batch of {len(items)} items from {url}: {e}")
+                return None
+            retry_delay = backoff_delay(attempt, retry_after_seconds(e))
+            logger.info(
+                f"Rate limit exceeded for {url}. Waiting for {retry_delay:.1f} seconds..."
+            )
+            time.sleep(retry_delay)
+        except Exception as e:
+            # Invalid or blocked responses, transport errors: only this
+            # batch is affected, its items are retried one by one
+            logger.warning(f"Batch extraction failed for {url}, extracting items one by one: {e}")
+            return None
+    logger.error(f"Retry limit reached for batch from {url}, extracting items one by one")
+    return None
+
+
+def process_page(
+    url: str,
+    site: str,
+    items: list[dict[str, str]],
+    batch_max_tokens: int = 0,
+    batch_max_items: int = 20,
+    extracted_results=None,
+):
+    """
+    Replace the announcements of a page with those extracted from its items
+    and record the page's content hash. extracted_results, if given, has
+    one result per item (from a batch job); items without one are
+    extracted here. Returns whether the page record was stored.
+    """
     db = get_fresh_db_session()
 
     try:
@@ -96,16 +169,23 @@ def process_page(url: str, site: str, items: list[dict[str, str]]):
                 for announcement in related_announcements:
                     db.delete(announcement)
 
-        # Process items with transaction per item
-        for item in items:
-            process_single_item(url, site, item)
+        # Process items with transaction per item. With batching, the
+        # contexts of a batch are extracted in one request first.
+        if extracted_results is not None:
+            for item, extracted_data in zip(items, extracted_results):
+                process_single_item(url, site, item, extracted_data)
+        elif batch_max_tokens:
+            for batch in batch_items(items, batch_max_tokens, batch_max_items):
+                results = extract_item_batch(url, batch) if len(batch) > 1 else None
+                for item, extracted_data in zip(batch, results or [None] * len(batch)):
+                    process_single_item(url, site, item, extracted_data)
+        else:
+            for item in items:
+                process_single_item(url, site, item)
 
         # Update scraped page record in its own transaction
         try:
-            merged_content = " ".join(
-                [item["context"] for item in items if item["context"] is not None]
-            )
-            content_hash = hashlib.sha256(merged_content.encode()).hexdigest()
+            content_hash = items_content_hash(items)
 
             if scraped_info is not None:
                 db.execute(
@@ -126,31 +206,63 @@ def process_page(url: str, site: str, items: list[dict[str, str]]):
                     )
                 )
             db.commit()
+            return True
         except Exception as e:
             db.rollback()
             logger.error(f"Error updating scraped page info for {url}: {e}")
+            return False
 
     except OperationalError as e:
         logger.error(f"Database connection error in process_page: {e}")
         # Don't need to rollback as session will be closed
+        return False
     except Exception as e:
         logger.error(f"Unexpected error in process_page for {url}: {e}")
         if db:
             db.rollback()
+        return False
     finally:
         if db:
             db.close()
 
 
-def process_single_item(url: str, site: str, item: dict[str, str]):
-    """Process a single item with its own database session and transaction"""
+def process_pages(pages, max_workers=4, batch_max_tokens=0, batch_max_items=20):
+    """
+    Run process_page for each (url, site, items) of pages on max_workers
+    threads, yielding (url, stored) once it is done. At most 2 * max_workers
+    pages are held at a time, so pages can be a lazy stream.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = {}
+        for url, site, items in pages:
+            if len(pending) >= 2 * max_workers:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield pending.pop(future), future.result()
+            future = executor.submit(
+                process_page, url, site, items, batch_max_tokens, batch_max_items
+            )
+            pending[future] = url
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield pending.pop(future), future.result()
+
+
+def process_single_item(
+    url: str, site: str, item: dict[str, str], extracted_data=None
+):
+    """
+    Process a single item with its own database session and transaction.
+    extracted_data is the item's result of a batched extraction, if any.
+    """
     retry_limit = 3
     retry_count = 0
 
     while retry_count < retry_limit:
         db = get_fresh_db_session()
         try:
-            extract_and_store_data(db, url, item, site)
+            extract_and_store_data(db, url, item, site, extracted_data)
             return  # Success, exit the retry loop
         except OperationalError as e:
             logger.error(f"Database connection error: {e}")
@@ -168,13 +280,10 @@ def process_single_item(url: str, site: str, item: dict[str, str]):
             return
         except APIError as e:
             if e.code == 429:
-                retry_delay = 60
-                if hasattr(e.details, "retryDelay"):
-                    retry_delay = e.details.retryDelay
-                elif isinstance(e.details, dict) and "retryDelay" in e.details:
-                    retry_delay = e.details["retryDelay"]
+                # Only this worker waits; the others keep going
+                retry_delay = backoff_delay(retry_count, retry_after_seconds(e))
                 logger.info(
-                    f"Rate limit exceeded for {url}. Waiting for {retry_delay} seconds..."
+                    f"Rate limit exceeded for {url}. Waiting for {retry_delay:.1f} seconds..."
                 )
                 time.sleep(retry_delay)
                 retry_count += 1
@@ -191,8 +300,11 @@ def process_single_item(url: str, site: str, item: dict[str, str]):
     logger.error(f"Retry limit reached for {url}. Skipping...")
 
 
-def extract_and_store_data(db, url: str, item: dict[str, str], site: str):
-    extracted_data = extract_with_gemini(item["context"], url)
+def extract_and_store_data(
+    db, url: str, item: dict[str, str], site: str, extracted_data=None
+):
+    if extracted_data is None:
+        extracted_data = extract_with_gemini(item["context"], url)
     if "announcements" in extracted_data:
         for announcement in extracted_data["announcements"]:
             institute = get_institute_from_website(db, item["site"])
@@ -0,0 +1,92 @@
+import random
+import re
+import threading
+import time
+
+
+class TokenBucket:
+    """Holds up to capacity units, refilled evenly over period seconds."""
+
+    def __init__(self, capacity, period=60.0):
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.available = capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.available = min(
+            self.capacity, self.available + (now - self.updated) * self.rate
+        )
+        self.updated = now
+
+    def wait_time(self, amount):
+        """Seconds until amount units are available (0 if they are now)."""
+        return max(0.0, (amount - self.available) / self.rate)
+
+
+class RateLimiter:
+    """
+    Requests-per-minute and tokens-per-minute quotas shared by all
+    extraction workers. acquire() blocks the calling thread until the
+    request fits in both buckets; a quota of 0 is not limited.
+    """
+
+    def __init__(self, requests_per_minute=0, tokens_per_minute=0):
+        self.lock = threading.Lock()
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+
+    def acquire(self, tokens=0):
+        needs = []
+        if self.requests:
+            needs.append((self.requests, 1))
+        if self.tokens:
+            # A request larger than the whole bucket would never fit
+            needs.append((self.tokens, min(tokens, self.tokens.capacity)))
+        if not needs:
+            return
+
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                for bucket, _ in needs:
+                    bucket.refill(now)
+                wait = max(bucket.wait_time(amount) for bucket, amount in needs)
+                if wait <= 0:
+                    for bucket, amount in needs:
+                        bucket.available -= amount
+                    return
+            time.sleep(wait)
+
+
+def estimate_tokens(text):
+    """Rough token count of text (about 4 characters per token)."""
+    return len(text) // 4 + 1
+
+
+def retry_after_seconds(error):
+    """
+    The retryDelay ("37s") of a Gemini 429 error, from the RetryInfo entry
+    of its details, or None if the error has none.
+    """
+    details = getattr(error, "details", None)
+    if isinstance(details, dict):
+        details = details.get("error", details).get("details", [])
+    if not isinstance(details, list):
+        return None
+    for detail in details:
+        if isinstance(detail, dict) and "retryDelay" in detail:
+            match = re.match(r"([\d.]+)s?$", str(detail["retryDelay"]))
+            if match:
+                return float(match.group(1))
+    return None
+
+
+def backoff_delay(attempt, retry_after=None, base=5.0, max_delay=60.0):
+    """
+    Seconds a worker waits after its attempt-th 429 (0-based): the server's
+    retry_after when given, otherwise exponential from base up to
+    max_delay, plus up to 50% jitter so workers do not retry in lockstep.
+    """
+    delay = retry_after if retry_after is not None else min(max_delay, base * 2**attempt)
+    return delay * random.uniform(1.0, 1.5)
@@ -1,65 +1,351 @@
+import argparse
+import os
+import subprocess
+import sys
 from scrapy.crawler import CrawlerProcess
 from scrapy.utils.project import get_project_settings
+from admission_scraper.spiders.combined import CombinedSpider
 from admission_scraper.spiders.pages import PagesSpider
+from admission_scraper.spiders.replay import ReplaySpider
 from admission_scraper.spiders.uni import UniSpider
-from llm.process import content_changed, process_page
+from admission_scraper.utils.frontier import open_frontier
+from admission_scraper.utils.records import iter_record_groups, record_path
+from admission_scraper.utils.revalidation import ValidatorStore
+from admission_scraper.utils.sharding import (
+    apply_shard_settings,
+    merge_shard_outputs,
+    shard_path,
+)
+from admission_scraper.utils.url import url_key
+from llm.batch import (
+    BatchJobTracker,
+    collect_batch_jobs,
+    make_batch_backend,
+    submit_batch_jobs,
+)
+from llm.cache import ResponseCache
+from llm.gemini import (
+    configure_context_cache,
+    configure_rate_limit,
+    configure_response_cache,
+    release_context_cache,
+)
+from llm.process import items_content_hash, process_pages
 from db.session import get_db
-from db.data import get_all_scraped_pages
-import pandas as pd
+from db.data import get_scraped_page_hashes
 
 settings = get_project_settings()
 
 
-def main():
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run the admission scraper")
+    parser.add_argument(
+        "--mode",
+        choices=["sequential", "combined"],
+        default="sequential",
+        help="sequential: UniSpider then PagesSpider via uni.jsonl; "
+        "combined: discovery and page extraction in a single streaming crawl",
+    )
+    parser.add_argument(
+        "--replay",
+        action="store_true",
+        help="re-run page extraction against the response archive without any network "
+        "and stop after writing the page output (process it with --skip-crawl)",
+    )
+    parser.add_argument(
+        "--shard-count",
+        type=int,
+        default=1,
+        help="split institutes by domain into this many shards; without "
+        "--shard-index every shard is crawled in its own local process",
+    )
+    parser.add_argument(
+        "--shard-index",
+        type=int,
+        default=None,
+        help="crawl only this shard (0-based) and exit, e.g. one shard per machine",
+    )
+    parser.add_argument(
+        "--skip-crawl",
+        action="store_true",
+        help="process existing output only (merging per-shard files when "
+        "--shard-count is given)",
+    )
+    parser.add_argument(
+        "--no-llm-cache",
+        action="store_true",
+        help="send every context to the LLM, ignoring and not updating the response cache",
+    )
+    parser.add_argument(
+        "--llm-batch",
+        choices=["submit", "collect"],
+        default=None,
+        help="submit: send new and changed pages to the LLM as batch jobs instead of "
+        "one request at a time; collect: store the results of finished batch jobs "
+        "(no crawl)",
+    )
+    args = parser.parse_args()
+    if args.shard_count < 1:
+        parser.error("--shard-count must be at least 1")
+    if args.shard_index is not None and not 0 <= args.shard_index < args.shard_count:
+        parser.error("--shard-index must be between 0 and --shard-count - 1")
+    if args.replay and (args.skip_crawl or args.llm_batch):
+        parser.error("--replay only writes the page output, process it with --skip-crawl")
+    return args
+
+
+def run_spiders(mode, replay=False, shard_index=0, shard_count=1):
+    if shard_count > 1:
+        apply_shard_settings(settings, shard_index, shard_count)
     process = CrawlerProcess(settings)
 
-    deferred = process.crawl(UniSpider)
-    deferred.addCallback(lambda _: process.crawl(PagesSpider))
-    # deferred = process.crawl(PagesSpider)
+    if replay:
+        process.crawl(ReplaySpider)
+    elif mode == "combined":
+        process.crawl(CombinedSpider)
+    else:
+        deferred = process.crawl(UniSpider)
+        deferred.addCallback(lambda _: process.crawl(PagesSpider))
     process.start()
 
+
+def run_shards(mode, shard_count, replay=False):
+    """Crawl every shard in its own process and wait for all of them."""
+    processes = []
+    for shard_index in range(shard_count):
+        command = [
+            sys.executable,
+            sys.argv[0],
+            "--mode",
+            mode,
+            "--shard-count",
+            str(shard_count),
+            "--shard-index",
+            str(shard_index),
+        ]
+        if replay:
+            command.append("--replay")
+        processes.append(subprocess.Popen(command))
+
+    for shard_index, process in enumerate(processes):
+        if process.wait() != 0:
+            print(f"Shard {shard_index} exited with code {process.returncode}")
+
+
+def iter_pages_to_process(pages_path, known_pages, counts):
+    """
+    Group the page items by URL and yield (url, site, items) for new and
+    changed pages, comparing each page's hash with known_pages in one pass
+    (no query per URL). counts is updated with the number of new, changed
+    and unchanged pages.
+    """
+    for i, (url, records) in enumerate(iter_record_groups(pages_path, "url")):
+        print("Processing group", i + 1)
+        site = records[0]["site"]
+        items = [
+            {key: value for key, value in record.items() if key != "url"}
+            for record in records
+        ]
+
+        known = known_pages.get(url)
+        if known is None:
+            status = "new"
+        elif known[0] != items_content_hash(items):
+            status = "changed"
+        else:
+            status = "unchanged"
+        counts[status] += 1
+        if status == "unchanged":
+            print(f"Skipping unchanged content for {url} (last scraped {known[1]})")
+            continue
+        yield url, site, items
+
+
+def open_llm_cache(bypass=False):
+    """Open the LLM response cache and use it for extraction, unless disabled."""
+    cache = None
+    if settings.getbool("LLM_CACHE_ENABLED") and not bypass:
+        cache = ResponseCache(
+            settings.get("LLM_CACHE_PATH", "llm_cache.sqlite"),
+            ttl_days=settings.getfloat("LLM_CACHE_TTL_DAYS", 30),
+            max_size_mb=settings.getfloat("LLM_CACHE_MAX_SIZE_MB", 200),
+        )
+        cache.open()
+    configure_response_cache(cache)
+    return cache
+
+
+def close_llm_cache(cache):
+    if cache is not None:
+        print(f"LLM cache: {cache.hits} hits, {cache.misses} misses")
+        cache.close()
+
+
+def shard_store_paths(path, shard_count):
+    """Existing files of a per-shard store (just path when not sharded)."""
+    paths = [path]
+    if shard_count > 1:
+        paths = [shard_path(path, i, shard_count) for i in range(shard_count)]
+    return [path for path in paths if os.path.exists(path)]
+
+
+def commit_revalidation(shard_count, skip_pages=(), only_pages=None):
+    """
+    Commit the validators staged by the crawl (of every shard), except
+    those of pages (url_key) that were not stored, so the next crawl
+    fetches them in full instead of dropping them as not modified. With
+    only_pages, only validators of those pages are committed.
+    """
+    if not settings.getbool("REVALIDATION_ENABLED"):
+        return
+    path = settings.get("REVALIDATION_STORE", "revalidation.sqlite")
+    for path in shard_store_paths(path, shard_count):
+        store = ValidatorStore(path)
+        store.open()
+        try:
+            committed = store.commit(skip_pages, only_pages)
+            print(f"Committed {committed} revalidation validators in {path}")
+        finally:
+            store.close()
+
+
+def commit_frontier(shard_count, skip_pages=(), only_pages=None):
+    """
+    Commit the frontier fetches staged by the crawl (of every shard), except
+    those of pages (url_key) that were not stored, which stay due. With
+    only_pages, only fetches of those pages are committed.
+    """
+    if not settings.getbool("FRONTIER_ENABLED"):
+        return
+    path = settings.get("FRONTIER_PATH", "frontier.sqlite")
+    for path in shard_store_paths(path, shard_count):
+        frontier = open_frontier(settings, path=path)
+        try:
+            committed = frontier.commit(skip_pages, only_pages)
+            print(f"Committed {committed} frontier fetches in {path}")
+        finally:
+            frontier.close()
+
+
+def open_batch_jobs():
+    backend = make_batch_backend(
+        settings.get("LLM_BATCH_JOB_BACKEND", "gemini"),
+        settings.get("LLM_BATCH_JOB_LOCAL_DIR", "llm_batch_local"),
+    )
+    tracker = BatchJobTracker(settings.get("LLM_BATCH_JOBS_PATH", "llm_batch_jobs.sqlite"))
+    tracker.open()
+    return backend, tracker
+
+
+def configure_llm_rate_limit():
+    configure_rate_limit(
+        settings.getint("LLM_REQUESTS_PER_MINUTE", 0),
+        settings.getint("LLM_TOKENS_PER_MINUTE", 0),
+    )
+
+
+def submit_batches(pages):
+    """Submit pages as batch jobs, returning the URLs of pages in open jobs."""
+    backend, tracker = open_batch_jobs()
     try:
-        df = pd.read_json("pages.jsonl", lines=True)
-
-        grouped_df = (
-            df.groupby("url")
-            .apply(
-                lambda x: pd.Series(
-                    {
-                        "site": x["site"].iloc[0],
-                        "items": x.to_dict("records"),
-                    }
-                ),
-                include_groups=False,
-            )
-            .reset_index()
+        jobs = submit_batch_jobs(
+            pages,
+            backend,
+            tracker,
+            max_requests=settings.getint("LLM_BATCH_JOB_MAX_REQUESTS", 10000),
         )
-        df = grouped_df
+        print(f"Submitted {len(jobs)} batch jobs, store their results with --llm-batch collect")
+        return tracker.pending_urls()
+    finally:
+        tracker.close()
+
+
+def collect_batches(shard_count=1, no_llm_cache=False):
+    backend, tracker = open_batch_jobs()
+    configure_llm_rate_limit()
+    cache = open_llm_cache(no_llm_cache)
+    try:
+        stored = set()
+        running = collect_batch_jobs(backend, tracker, stored)
+        print(f"{running} batch jobs still running")
+        # The crawl left the state of these pages uncommitted (see main)
+        stored_pages = {url_key(url) for url in stored}
+        commit_revalidation(shard_count, only_pages=stored_pages)
+        commit_frontier(shard_count, only_pages=stored_pages)
+    finally:
+        tracker.close()
+        close_llm_cache(cache)
+
 
+
+def main():
+    args = parse_args()
+    if args.llm_batch == "collect":
+        collect_batches(args.shard_count, args.no_llm_cache)
+        return
+
+    if not args.skip_crawl:
+        if args.shard_count > 1 and args.shard_index is None:
+            run_shards(args.mode, args.shard_count, args.replay)
+        else:
+            run_spiders(args.mode, args.replay, args.shard_index or 0, args.shard_count)
+            if args.shard_count > 1:
+                # Processing needs every shard; merge with --skip-crawl once all are done
+                print(f"Shard {args.shard_index} of {args.shard_count} done")
+                return
+
+    pages_path = record_path("pages", settings.get("PAGE_OUTPUT_FORMAT", "jsonl.gz"))
+    if args.shard_count > 1:
+        for path in ("uni.jsonl", pages_path):
+            records = merge_shard_outputs(path, args.shard_count)
+            if records is not None:
+                print(f"Merged {records} records from {args.shard_count} shards into {path}")
+    if args.replay:
+        # Processing calls the LLM and writes to the database
+        print(f"Replay done, process {pages_path} with --skip-crawl")
+        return
+
+    try:
         db = next(get_db())
-        scraped_pages = get_all_scraped_pages(db)
-        scraped_urls = (
-            [page.url for page in scraped_pages] if scraped_pages is not None else []
-        )
+        try:
+            known_pages = get_scraped_page_hashes(db) or {}
+        finally:
+            db.close()
 
-        for i, (_, row) in enumerate(df.iterrows()):
-            print("Processing group", i + 1, "of", len(df))
-            if row["url"] in scraped_urls:
-                print(f"Skipping {row['url']}")
-                continue
-
-            merged_content = " ".join(
-                [
-                    item["context"]
-                    for item in row["items"]
-                    if item["context"] is not None
-                ]
-            )
-            if not content_changed(row["url"], merged_content):
-                print(f"Skipping unchanged content for {row['url']}")
-                continue
-            process_page(row["url"], row["site"], row["items"])
-            print(f"Processed group {i + 1} - {row['url']}")
+        counts = {"new": 0, "changed": 0, "unchanged": 0}
+        configure_llm_rate_limit()
+        cache = open_llm_cache(args.no_llm_cache)
+        try:
+            pages = iter_pages_to_process(pages_path, known_pages, counts)
+            not_stored = set()
+            if args.llm_batch == "submit":
+                # Pages in batch jobs are stored by --llm-batch collect, which
+                # commits their crawl state
+                not_stored = {url_key(url) for url in submit_batches(pages)}
+            else:
+                configure_context_cache(settings.getint("LLM_CONTEXT_CACHE_TTL_SECONDS", 0))
+                for i, (url, stored) in enumerate(
+                    process_pages(
+                        pages,
+                        max_workers=settings.getint("LLM_MAX_WORKERS", 4),
+                        batch_max_tokens=settings.getint("LLM_BATCH_MAX_TOKENS", 0),
+                        batch_max_items=settings.getint("LLM_BATCH_MAX_ITEMS", 20),
+                    )
+                ):
+                    print(f"Processed page {i + 1} - {url}")
+                    if not stored:
+                        print(f"Page was not stored, it stays due for a crawl: {url}")
+                        not_stored.add(url_key(url))
+            commit_revalidation(args.shard_count, not_stored)
+            commit_frontier(args.shard_count, not_stored)
+        finally:
+            release_context_cache()
+            close_llm_cache(cache)
+
+        print(
+            f"Pages: {counts['new']} new, {counts['changed']} changed, "
+            f"{counts['unchanged']} unchanged"
+        )
     except Exception as e:
         print(f"Error processing group: {e}")
 